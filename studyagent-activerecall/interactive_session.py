@@ -5,34 +5,85 @@ This provides a true back-and-forth conversation with the AI tutor.
 """
 
 import os
+import re
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
 from recall import ActiveRecallSystem, setup_dummy_data
 
+# Matches a leading '?' or common question phrasings in one case-insensitive
+# scan instead of lowercasing and substring-checking per phrase every turn
+_QUESTION_RE = re.compile(
+    r"^\?|\b(?:what\s+is|how\s+do|why\s+does|can\s+you\s+explain|what\s+does)\b",
+    re.IGNORECASE
+)
+
 class InteractiveSession:
-    def __init__(self, system: ActiveRecallSystem):
-        self.system = system
+    def __init__(self, system):
+        # Accept either a ready ActiveRecallSystem or a Future building one in
+        # the background, so the menu can show before init finishes
+        if isinstance(system, Future):
+            self._system = None
+            self._system_future = system
+        else:
+            self._system = system
+            self._system_future = None
         self.current_conversation = None
-    
+        # Single worker so DB writes and prefetches overlap with the user
+        # typing at the blocking input() prompt instead of serializing after it
+        self._background = ThreadPoolExecutor(max_workers=1)
+        self._pending_tasks = []
+
+    @property
+    def system(self) -> ActiveRecallSystem:
+        """The underlying system, waiting for background init if needed"""
+        if self._system is None:
+            self._system = self._system_future.result()
+        return self._system
+
+    def _submit_background(self, fn, *args):
+        """Queue work to run while the user is thinking/typing"""
+        self._pending_tasks = [t for t in self._pending_tasks if not t.done()]
+        self._pending_tasks.append(self._background.submit(fn, *args))
+
+    def _drain_background(self):
+        """Wait for queued background work before reading session state"""
+        for task in self._pending_tasks:
+            task.result()
+        self._pending_tasks = []
+
+    @staticmethod
+    def _emit(*lines):
+        """Write several output lines with one buffered flush instead of a
+        print (and stdout flush) per line"""
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+    @staticmethod
+    def _print_stream_chunk(chunk):
+        """Print a streamed tutor token as soon as it arrives"""
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+
     def start_session(self):
         """Start an interactive study session"""
         print("\n" + "="*60)
         print("🧠 INTERACTIVE ACTIVE RECALL SESSION")
         print("="*60)
         
-        # Show available concepts
-        concepts_due = self.system.db.get_concepts_due_for_review()
+        # Show available concepts (only fetch the 5 we display)
+        concepts_due = self.system.db.get_concepts_due_for_review(limit=5)
         if not concepts_due:
             print("📚 No concepts are due for review right now!")
             return
-        
+
         print(f"\n📚 Available concepts to study:")
-        for i, concept in enumerate(concepts_due[:5], 1):  # Show first 5
+        for i, concept in enumerate(concepts_due, 1):
             print(f"   {i}. {concept.name} (Mastery: {concept.mastery_level.name})")
-        
+
         # Let user choose concept
         while True:
             try:
-                choice = input(f"\nChoose a concept (1-{min(5, len(concepts_due))}) or 'q' to quit: ").strip()
+                choice = input(f"\nChoose a concept (1-{len(concepts_due)}) or 'q' to quit: ").strip()
                 if choice.lower() == 'q':
                     return
                 
@@ -50,14 +101,16 @@ class InteractiveSession:
     
     def run_conversation(self, concept):
         """Run the actual interactive conversation"""
-        print(f"\n🎯 Starting session with: {concept.name}")
-        print(f"📈 Current mastery: {concept.mastery_level.name}")
-        print(f"🔄 Times reviewed: {concept.review_count}")
-        
+        self._emit(
+            f"\n🎯 Starting session with: {concept.name}",
+            f"📈 Current mastery: {concept.mastery_level.name}",
+            f"🔄 Times reviewed: {concept.review_count}"
+        )
+
         # Start the conversation
         self.current_conversation = self.system.start_interactive_session(concept.id)
-        
-        print(f"\n🤖 Tutor: {self.current_conversation.original_question}")
+
+        self._emit(f"\n🤖 Tutor: {self.current_conversation.original_question}")
         
         conversation_active = True
         while conversation_active:
@@ -74,48 +127,63 @@ class InteractiveSession:
                 continue
             
             # Check if user is asking a question
-            if user_response.startswith('?') or any(word in user_response.lower() for word in ['what is', 'how do', 'why does', 'can you explain', 'what does']):
-                # Handle user question
+            if _QUESTION_RE.search(user_response):
+                # Handle user question, then ask a follow-up to continue the
+                # learning — emitted as a single buffered write
                 result = self.system.handle_user_question(self.current_conversation, user_response)
-                print(f"\n🤖 Tutor: {result['answer']}")
-                
-                # Ask a follow-up question to continue the learning
+                tutor_lines = [f"\n🤖 Tutor: {result['answer']}"]
                 if result.get('follow_up_question'):
-                    print(f"\n🤖 Tutor: {result['follow_up_question']}")
+                    tutor_lines.append(f"\n🤖 Tutor: {result['follow_up_question']}")
+                self._emit(*tutor_lines)
             else:
-                # Process as normal answer to tutor's question
-                result = self.system.continue_conversation(self.current_conversation, user_response)
-                
-                # Show the AI tutor's guiding response
-                print(f"\n🤖 Tutor: {result['guiding_response']}")
+                # Process as normal answer to tutor's question, streaming the
+                # tutor's reply token-by-token as it is generated
+                sys.stdout.write("\n🤖 Tutor: ")
+                sys.stdout.flush()
+                result = self.system.continue_conversation(
+                    self.current_conversation, user_response,
+                    stream_callback=self._print_stream_chunk
+                )
+                sys.stdout.write("\n")
+                sys.stdout.flush()
             
             # The conversation continues until user decides to end it
         
-        # End the conversation and record session
+        # End the conversation and record session (one transaction, which also
+        # returns the refreshed concept and weaknesses for the progress update)
         if self.current_conversation:
-            end_result = self.system.end_conversation(self.current_conversation)
-            print(f"\n🎉 Session complete!")
-            print(f"📈 Total exchanges: {end_result['total_attempts']}")
+            self._drain_background()
+            final = self.system.finalize_session(self.current_conversation)
+            end_result = final['end_result']
+            summary_lines = [
+                f"\n🎉 Session complete!",
+                f"📈 Total exchanges: {end_result['total_attempts']}"
+            ]
             if end_result.get('remediation_needed', False):
-                print(f"🎯 This concept has been marked for additional review.")
-        
-        # Show progress after session
-        self.show_progress_update(concept)
-    
-    def show_progress_update(self, concept):
-        """Show updated progress after session"""
-        updated_concept = self.system.db.get_concept(concept.id)
-        weaknesses = self.system.db.get_concept_weaknesses(concept.id)
-        
-        print(f"\n📊 Progress Update for {concept.name}:")
-        print(f"   Mastery Level: {concept.mastery_level.name} → {updated_concept.mastery_level.name}")
-        print(f"   Review Count: {concept.review_count} → {updated_concept.review_count}")
-        print(f"   Correct Streak: {concept.correct_streak} → {updated_concept.correct_streak}")
-        
+                summary_lines.append(f"🎯 This concept has been marked for additional review.")
+            self._emit(*summary_lines)
+
+            # Show progress after session
+            self.show_progress_update(concept, final['updated_concept'], final['weaknesses'])
+
+        # Warm the due-list cache while the user sits at the menu so the next
+        # 'study' command starts instantly
+        self._submit_background(self.system.db.get_concepts_due_for_review, 5)
+
+    def show_progress_update(self, concept, updated_concept, weaknesses):
+        """Show updated progress after session using pre-fetched data"""
+        lines = [
+            f"\n📊 Progress Update for {concept.name}:",
+            f"   Mastery Level: {concept.mastery_level.name} → {updated_concept.mastery_level.name}",
+            f"   Review Count: {concept.review_count} → {updated_concept.review_count}",
+            f"   Correct Streak: {concept.correct_streak} → {updated_concept.correct_streak}"
+        ]
+
         if weaknesses:
-            print(f"\n🎯 Tracked Weaknesses:")
+            lines.append(f"\n🎯 Tracked Weaknesses:")
             for weakness in weaknesses:
-                print(f"   • {weakness['area']} (Severity: {weakness['severity']}, Times: {weakness['times_encountered']})")
+                lines.append(f"   • {weakness['area']} (Severity: {weakness['severity']}, Times: {weakness['times_encountered']})")
+        self._emit(*lines)
     
     def run_multiple_sessions(self):
         """Run multiple study sessions in a row"""
@@ -154,9 +222,10 @@ class InteractiveSession:
         # Show concepts with most weaknesses
         print(f"\n🎯 Concepts Needing Attention:")
         concepts_due = self.system.db.get_concepts_due_for_review()
-        for concept in concepts_due[:3]:
-            weaknesses = self.system.db.get_concept_weaknesses(concept.id)
-            weakness_count = len(weaknesses)
+        top_concepts = concepts_due[:3]
+        weaknesses_by_id = self.system.db.get_weaknesses_for_concepts([c.id for c in top_concepts])
+        for concept in top_concepts:
+            weakness_count = len(weaknesses_by_id[concept.id])
             print(f"   • {concept.name}: {weakness_count} tracked weaknesses")
     
     def show_help(self):
@@ -185,18 +254,20 @@ def main():
         print("   The system needs Claude AI for interactive conversations.")
         return 1
     
-    try:
-        # Initialize system
+    def build_system():
+        # Initialize system and set up dummy data if no concepts exist
         system = ActiveRecallSystem(api_key, "interactive_session.db")
-        
-        # Set up dummy data if no concepts exist
         progress = system.get_study_progress()
         if progress['total_concepts'] == 0:
             print("📚 Setting up initial study materials...")
             setup_dummy_data(system)
-        
-        # Start interactive session
-        session = InteractiveSession(system)
+        return system
+
+    try:
+        # Build the system in the background so the menu appears immediately;
+        # the first command that needs it waits only for unfinished init
+        init_executor = ThreadPoolExecutor(max_workers=1)
+        session = InteractiveSession(init_executor.submit(build_system))
         session.run_multiple_sessions()
         
     except KeyboardInterrupt:
@@ -1,11 +1,25 @@
+import asyncio
+import atexit
 import sqlite3
 import json
 import datetime
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Set, Tuple
+import bisect
+import functools
+import itertools
+import math
 import random
+import re
 import anthropic
+import httpx
 import os
 
 class MasteryLevel(Enum):
@@ -21,7 +35,121 @@ class DifficultyLevel(Enum):
     ADVANCED = 3
     EXPERT = 4
 
-@dataclass
+# Fast model for the latency-critical interactive calls
+MODEL_FAST = "claude-haiku-4-5"
+
+# Technical-reasoning markers used by the improvement heuristic
+# Non-answers we can grade locally without an API round trip; checked after
+# stripping punctuation and lowercasing
+_TRIVIAL_WRONG = frozenset({
+    "", "idk", "i dont know", "no idea", "not sure", "im not sure", "dunno",
+    "no clue", "pass",
+})
+_TRIVIAL_RE = re.compile(r"[^\w\s]")
+
+def _trivial_non_answer(user_answer: str) -> bool:
+    """True when the reply is an empty or 'I don't know'-style non-answer"""
+    norm = " ".join(_TRIVIAL_RE.sub("", user_answer.lower()).split())
+    return norm in _TRIVIAL_WRONG or len(norm) < 3
+
+_TECH_WORDS = frozenset({"because", "since", "therefore", "complexity", "time", "space"})
+
+# Completion caps per call type — the prompts ask for 1-2 sentence replies,
+# so anything beyond these caps is pure decode latency; tune in one place
+LIMITS = {
+    "gen": 300,      # question generation (Question/Expected Answer pair)
+    "turn": 400,     # fused evaluate+guide+weaknesses JSON
+    "guide": 60,     # standalone guiding response
+    "weakness": 80,  # standalone weakness list
+    "qa": 200,       # answer + follow-up to a student question
+    "summary": 80,   # rolling history summary
+}
+
+# Matches the "Label: value" lines Claude is asked to respond with, capturing
+# multi-line values up to the next label, so each response is parsed in a
+# single compiled-regex scan instead of a per-line startswith chain
+_LABEL_RE = re.compile(
+    r"^(Question|Expected Answer|Score|Feedback|Hints):[ \t]*"
+    r"(.*?)(?=\n(?:Question|Expected Answer|Score|Feedback|Hints):|\Z)",
+    re.MULTILINE | re.DOTALL
+)
+
+# Answer/Follow-up reply shape from handle_user_question; DOTALL so
+# multi-line answers survive instead of being cut at the first newline
+_ANS_RE = re.compile(r"Answer:\s*(?P<ans>.*?)\s*(?:Follow-up:\s*(?P<fu>.*))?\Z", re.DOTALL)
+
+def _parse_labeled(text: str) -> Dict[str, str]:
+    """Parse a 'Label: value' formatted model response into a dict"""
+    return {label: value.strip() for label, value in _LABEL_RE.findall(text)}
+
+# Spaced-repetition review intervals in days, indexed by MasteryLevel value
+# (UNKNOWN, LEARNING, FAMILIAR, PROFICIENT, MASTERED); also used to seed FSRS
+# stability for concepts created before the stability/difficulty columns
+_INTERVALS = (1, 2, 4, 7, 14)
+
+# FSRS-4.5 scheduling: each concept carries a difficulty (1-10) and a
+# stability (days until retrievability decays to 90%). These are the
+# published default parameters for the recall/lapse stability updates
+# (w8-w10 / w11-w14) and the difficulty drift (w6).
+_FSRS_TARGET_RETENTION = 0.9
+_FSRS_W6 = 0.86
+_FSRS_W8 = 1.54575
+_FSRS_W9 = 0.1192
+_FSRS_W10 = 1.01925
+_FSRS_W11 = 1.9395
+_FSRS_W12 = 0.11
+_FSRS_W13 = 0.29605
+_FSRS_W14 = 2.2698
+_FSRS_W17 = 0.5425
+_FSRS_W18 = 0.0912
+
+def _fsrs_retrievability(elapsed_days: float, stability: float) -> float:
+    """Probability of recall after elapsed_days (FSRS power forgetting curve)"""
+    return (1.0 + elapsed_days / (9.0 * stability)) ** -1.0
+
+def _fsrs_next_stability(stability: float, difficulty: float,
+                         retrievability: float, recalled: bool) -> float:
+    """Post-review stability for a successful recall or a lapse"""
+    if recalled:
+        stability = stability * (1.0 + math.exp(_FSRS_W8)
+                                 * (11.0 - difficulty)
+                                 * stability ** -_FSRS_W9
+                                 * (math.exp(_FSRS_W10 * (1.0 - retrievability)) - 1.0))
+    else:
+        stability = (_FSRS_W11 * difficulty ** -_FSRS_W12
+                     * ((stability + 1.0) ** _FSRS_W13 - 1.0)
+                     * math.exp(_FSRS_W14 * (1.0 - retrievability)))
+    return max(stability, 0.1)
+
+def _fsrs_short_term_stability(stability: float, recalled: bool) -> float:
+    """Same-day review update — the long-term formula is a no-op when no
+    time has passed, so sub-day repeats use the short-term rule instead"""
+    grade = 3 if recalled else 1
+    return max(stability * math.exp(_FSRS_W17 * (grade - 3 + _FSRS_W18)), 0.1)
+
+def _fsrs_next_difficulty(difficulty: float, recalled: bool) -> float:
+    """Drift difficulty toward harder on lapses, clamped to 1-10"""
+    grade = 3 if recalled else 1
+    return min(max(difficulty - _FSRS_W6 * (grade - 3), 1.0), 10.0)
+
+def _mastery_from_stability(stability: float) -> int:
+    """UI-facing MasteryLevel bucket derived from stability (same day
+    thresholds as the old fixed interval table)"""
+    level = 0
+    for threshold in _INTERVALS[1:]:
+        if stability >= threshold:
+            level += 1
+    return level
+
+# Review-section sampling weights by mastery level; anything not listed
+# (PROFICIENT/MASTERED) gets the baseline weight of 1.0
+_MASTERY_WEIGHT = {
+    MasteryLevel.UNKNOWN: 3.0,
+    MasteryLevel.LEARNING: 2.0,
+    MasteryLevel.FAMILIAR: 1.5,
+}
+
+@dataclass(slots=True)
 class NotesSection:
     section_id: str
     title: str
@@ -32,7 +160,7 @@ class NotesSection:
     times_studied: int = 0
     last_studied: Optional[datetime.datetime] = None
 
-@dataclass
+@dataclass(slots=True)
 class Concept:
     id: int
     name: str
@@ -43,10 +171,11 @@ class Concept:
     review_count: int
     correct_streak: int
     difficulty_level: DifficultyLevel
-    notes_sections: List[NotesSection] = None
+    notes_sections: Optional[List[NotesSection]] = None
     current_section_index: int = 0
+    content_hash: str = ""
 
-@dataclass
+@dataclass(slots=True)
 class Question:
     concept_id: int
     question_text: str
@@ -54,7 +183,7 @@ class Question:
     difficulty: DifficultyLevel
     question_type: str  # "recall", "application", "synthesis"
 
-@dataclass
+@dataclass(slots=True)
 class ReviewSession:
     concept_id: int
     question: str
@@ -65,25 +194,158 @@ class ReviewSession:
     follow_up_questions: int = 0
     weakness_identified: bool = False
 
-@dataclass
+@dataclass(slots=True)
 class ConversationState:
     concept_id: int
     original_question: str
     conversation_history: List[Dict[str, str]]
     attempts: int
     needs_remediation: bool
-    weakness_areas: List[str]
+    # Areas already tracked this session (or before it), so repeats within a
+    # session cost neither memory nor a DB write
+    weakness_areas: Set[str]
+    # Rolling one-line summary of turns older than the verbatim window, so
+    # prompt size stays O(1) no matter how long the session runs
+    summary: str = ""
+    summary_upto: int = 0
+    # JSON encoding of the history built up one turn at a time, so ending a
+    # session doesn't re-serialize every message from scratch
+    serialized_prefix: str = ""
+    serialized_count: int = 0
+
+    def append_turn(self, role: str, content: str) -> None:
+        """Append a turn and serialize it once, right away"""
+        entry = {"role": role, "content": content}
+        self.conversation_history.append(entry)
+        self.serialized_prefix += json.dumps(entry) + ","
+        self.serialized_count += 1
+
+    def serialized_history(self) -> str:
+        """The full history as JSON, reusing the per-turn prefix when every
+        entry went through append_turn"""
+        if self.serialized_count == len(self.conversation_history):
+            return "[" + self.serialized_prefix.rstrip(",") + "]"
+        return json.dumps(self.conversation_history)
 
 class ActiveRecallDatabase:
     def __init__(self, db_path: str = "active_recall.db"):
         self.db_path = db_path
+        # Hot in-session caches, invalidated on every concept write
+        self._concept_cache: Dict[int, Concept] = {}
+        self._due_cache: Dict[Optional[int], List[Concept]] = {}
+        # Non-critical writes (weakness tracking) go through a background
+        # queue so conversation turns don't block on SQLite commits
+        self._write_queue: queue.Queue = queue.Queue()
+        self._writer_thread: Optional[threading.Thread] = None
+        # One persistent connection reused by every method instead of an
+        # open/close per call; the RLock serializes the writer thread and
+        # allows nested transaction() blocks on the main thread
+        # cached_statements keeps prepared statements for our hot queries
+        # alive in the driver's LRU instead of re-parsing the SQL text
+        self._conn = sqlite3.connect(db_path, check_same_thread=False,
+                                     cached_statements=256)
+        self._lock = threading.RLock()
+        self._txn_depth = 0
+        self._tune_connection(self._conn)
+        atexit.register(self.close)
         self.init_database()
+
+    @staticmethod
+    def _tune_connection(conn: sqlite3.Connection):
+        """Apply once-per-connection PRAGMAs: WAL avoids the rollback-journal
+        fsync on every commit, synchronous=NORMAL is safe under WAL, and the
+        busy timeout keeps the background writer from failing on contention"""
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-64000")
+        cursor.execute("PRAGMA mmap_size=268435456")
+
+    @contextmanager
+    def transaction(self):
+        """Run statements on the shared connection; nested blocks join the
+        outermost transaction, which alone commits (or rolls back)"""
+        with self._lock:
+            self._txn_depth += 1
+            try:
+                yield self._conn
+                if self._txn_depth == 1:
+                    self._conn.commit()
+            except Exception:
+                if self._txn_depth == 1:
+                    self._conn.rollback()
+                raise
+            finally:
+                self._txn_depth -= 1
+
+    def close(self):
+        """Close the shared connection on shutdown (safe to call twice —
+        it is also registered with atexit)"""
+        with self._lock:
+            try:
+                self._conn.execute('PRAGMA optimize')
+                self._conn.close()
+            except sqlite3.ProgrammingError:
+                pass  # already closed
+
+    def _ensure_writer(self):
+        if self._writer_thread is None or not self._writer_thread.is_alive():
+            self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self._writer_thread.start()
+
+    def _writer_loop(self):
+        """Drain queued writes, coalescing bursts into one transaction"""
+        while True:
+            items = [self._write_queue.get()]
+            while True:
+                try:
+                    items.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                now_iso = datetime.datetime.now().isoformat()
+                with self.transaction():
+                    for concept_id, weakness_areas, severity in items:
+                        self.add_concept_weaknesses(concept_id, weakness_areas,
+                                                    severity, now_iso=now_iso)
+            finally:
+                for _ in items:
+                    self._write_queue.task_done()
+
+    def queue_concept_weakness(self, concept_id: int, weakness_area: str, severity: int = 1):
+        """Record a weakness without blocking the caller on the DB write"""
+        self.queue_concept_weaknesses(concept_id, [weakness_area], severity)
+
+    def queue_concept_weaknesses(self, concept_id: int, weakness_areas: List[str], severity: int = 1):
+        """Record a batch of weaknesses without blocking the caller"""
+        self._ensure_writer()
+        self._write_queue.put((concept_id, weakness_areas, severity))
+
+    def flush_writes(self):
+        """Block until all queued background writes have been committed"""
+        self._write_queue.join()
+
+    def _invalidate_cache(self, concept_id: Optional[int] = None):
+        """Drop cached reads after a write touches concept state"""
+        self._due_cache.clear()
+        if concept_id is None:
+            self._concept_cache.clear()
+        else:
+            self._concept_cache.pop(concept_id, None)
     
     def init_database(self):
         """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        with self.transaction() as conn:
+            self._create_tables(conn.cursor())
+        # Refresh planner statistics so the indexes created above are used
+        with self._lock:
+            self._conn.execute('ANALYZE')
+
+    def _create_tables(self, cursor):
+
         # Concepts table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS concepts (
@@ -95,10 +357,60 @@ class ActiveRecallDatabase:
                 next_review TEXT,
                 review_count INTEGER DEFAULT 0,
                 correct_streak INTEGER DEFAULT 0,
-                difficulty_level INTEGER DEFAULT 1
+                difficulty_level INTEGER DEFAULT 1,
+                last_reviewed_ts INTEGER,
+                next_review_ts INTEGER,
+                stability REAL,
+                difficulty REAL,
+                content_hash TEXT,
+                content_tokens INTEGER
             )
         ''')
-        
+
+        # Integer epoch mirrors of the ISO text columns — comparing and
+        # indexing INTEGER is cheaper than TEXT; the text columns stay for
+        # compatibility with anything reading the database directly. The
+        # stability/difficulty REAL columns hold the FSRS scheduler state.
+        for column, col_type in (('last_reviewed_ts', 'INTEGER'),
+                                 ('next_review_ts', 'INTEGER'),
+                                 ('stability', 'REAL'),
+                                 ('difficulty', 'REAL'),
+                                 ('content_hash', 'TEXT'),
+                                 ('content_tokens', 'INTEGER')):
+            try:
+                cursor.execute(f'ALTER TABLE concepts ADD COLUMN {column} {col_type}')
+            except sqlite3.OperationalError:
+                pass  # column already exists
+        cursor.execute('''
+            UPDATE concepts
+            SET last_reviewed_ts = CAST(strftime('%s', last_reviewed) AS INTEGER),
+                next_review_ts = CAST(strftime('%s', next_review) AS INTEGER)
+            WHERE next_review_ts IS NULL AND next_review IS NOT NULL
+        ''')
+        # Backfill content hashes for pre-migration rows
+        stale = cursor.execute(
+            'SELECT id, content FROM concepts WHERE content_hash IS NULL'
+        ).fetchall()
+        if stale:
+            cursor.executemany(
+                'UPDATE concepts SET content_hash = ?, content_tokens = ? WHERE id = ?',
+                [(hashlib.sha256(content.encode()).hexdigest(), len(content) // 4, row_id)
+                 for row_id, content in stale]
+            )
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_concepts_hash ON concepts(content_hash)
+        ''')
+
+        # Seed FSRS state from the old fixed interval table
+        cursor.execute('''
+            UPDATE concepts
+            SET stability = CASE mastery_level
+                    WHEN 0 THEN 1.0 WHEN 1 THEN 2.0 WHEN 2 THEN 4.0
+                    WHEN 3 THEN 7.0 ELSE 14.0 END,
+                difficulty = 5.0
+            WHERE stability IS NULL
+        ''')
+
         # Review sessions table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS review_sessions (
@@ -128,221 +440,555 @@ class ActiveRecallDatabase:
                 FOREIGN KEY (concept_id) REFERENCES concepts (id)
             )
         ''')
-        
-        conn.commit()
-        conn.close()
-    
+
+        # Indexes for the due-review scan and the weakness upsert lookup
+        cursor.execute('DROP INDEX IF EXISTS idx_concepts_due')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_concepts_due_ts
+            ON concepts(next_review_ts, mastery_level)
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_weakness_unique
+            ON concept_weaknesses(concept_id, weakness_area)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sessions_concept
+            ON review_sessions(concept_id, timestamp DESC)
+        ''')
+
+        # Cached Claude question generations keyed by content/section/mastery
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS question_cache (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+
+    # Keep at most this many cached questions on disk
+    QUESTION_CACHE_LIMIT = 512
+
+    def get_cached_question(self, key: str) -> Optional[str]:
+        """Look up a cached question payload by key"""
+        with self._lock:
+            row = self._conn.cursor().execute(
+                'SELECT payload FROM question_cache WHERE key = ?', (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def cache_question(self, key: str, payload: str):
+        """Store a question payload, evicting the oldest entries past the cap"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO question_cache (key, payload, created_at)
+                VALUES (?, ?, ?)
+            ''', (key, payload, datetime.datetime.now().isoformat()))
+            cursor.execute('''
+                DELETE FROM question_cache WHERE rowid NOT IN (
+                    SELECT rowid FROM question_cache ORDER BY created_at DESC LIMIT ?
+                )
+            ''', (self.QUESTION_CACHE_LIMIT,))
+
     def add_concept(self, name: str, content: str) -> int:
         """Add a new concept to study"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        now = datetime.datetime.now().isoformat()
-        cursor.execute('''
-            INSERT INTO concepts (name, content, last_reviewed, next_review)
-            VALUES (?, ?, ?, ?)
-        ''', (name, content, now, now))
-        
-        concept_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            now = datetime.datetime.now()
+            now_ts = int(now.timestamp())
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO concepts (name, content, last_reviewed, next_review,
+                                      last_reviewed_ts, next_review_ts,
+                                      content_hash, content_tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, content, now.isoformat(), now.isoformat(), now_ts, now_ts,
+                  hashlib.sha256(content.encode()).hexdigest(), len(content) // 4))
+            concept_id = cursor.lastrowid
+        self._invalidate_cache()
         return concept_id
+
+    def add_concepts(self, materials: List[Tuple[str, str]]) -> List[int]:
+        """Add several (name, content) concepts in one executemany
+        transaction, returning the new row ids in insertion order"""
+        with self.transaction() as conn:
+            now = datetime.datetime.now()
+            now_iso = now.isoformat()
+            now_ts = int(now.timestamp())
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO concepts (name, content, last_reviewed, next_review,
+                                      last_reviewed_ts, next_review_ts,
+                                      content_hash, content_tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(name, content, now_iso, now_iso, now_ts, now_ts,
+                   hashlib.sha256(content.encode()).hexdigest(), len(content) // 4)
+                  for name, content in materials])
+            last_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+        self._invalidate_cache()
+        return list(range(last_id - len(materials) + 1, last_id + 1))
     
+    # Explicit projection shared by every concept read; keeps the row layout
+    # stable even if the table later grows columns
+    _CONCEPT_COLUMNS = ('id, name, content, mastery_level, last_reviewed, '
+                        'next_review, review_count, correct_streak, difficulty_level, '
+                        'last_reviewed_ts, next_review_ts, content_hash')
+
+    # Hot statements built once so the same SQL string (and therefore the
+    # same cached prepared statement) is reused on every call
+    _SQL_GET_CONCEPT = f'SELECT {_CONCEPT_COLUMNS} FROM concepts WHERE id = ?'
+    _SQL_DUE = (f'SELECT {_CONCEPT_COLUMNS} FROM concepts '
+                'WHERE next_review_ts <= ? OR review_count = 0 '
+                'ORDER BY mastery_level ASC, next_review_ts ASC')
+    _SQL_DUE_LIMITED = _SQL_DUE + ' LIMIT ?'
+
+    @staticmethod
+    def _when(ts: Optional[int], iso: Optional[str]) -> datetime.datetime:
+        """Build a datetime from the epoch column; fromtimestamp is much
+        cheaper than fromisoformat, which only remains as the fallback for
+        rows written before the integer columns existed"""
+        if ts is not None:
+            return datetime.datetime.fromtimestamp(ts)
+        if iso:
+            return datetime.datetime.fromisoformat(iso)
+        return datetime.datetime.now()
+
+    @classmethod
+    def _row_to_concept(cls, row) -> Concept:
+        return Concept(
+            id=row[0],
+            name=row[1],
+            content=row[2],
+            mastery_level=MasteryLevel(row[3]),
+            last_reviewed=cls._when(row[9], row[4]),
+            next_review=cls._when(row[10], row[5]),
+            review_count=row[6],
+            correct_streak=row[7],
+            difficulty_level=DifficultyLevel(row[8]),
+            content_hash=row[11] or ''
+        )
+
+    def find_concept_by_hash(self, content_hash: str) -> Optional[int]:
+        """Return the id of a concept with identical content, if any"""
+        with self._lock:
+            row = self._conn.cursor().execute(
+                'SELECT id FROM concepts WHERE content_hash = ?', (content_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
     def get_concept(self, concept_id: int) -> Optional[Concept]:
         """Get a concept by ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM concepts WHERE id = ?', (concept_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
+        cached = self._concept_cache.get(concept_id)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute(self._SQL_GET_CONCEPT, (concept_id,))
+            row = cursor.fetchone()
+
         if row:
-            return Concept(
-                id=row[0],
-                name=row[1],
-                content=row[2],
-                mastery_level=MasteryLevel(row[3]),
-                last_reviewed=datetime.datetime.fromisoformat(row[4]) if row[4] else datetime.datetime.now(),
-                next_review=datetime.datetime.fromisoformat(row[5]) if row[5] else datetime.datetime.now(),
-                review_count=row[6],
-                correct_streak=row[7],
-                difficulty_level=DifficultyLevel(row[8])
-            )
+            concept = self._row_to_concept(row)
+            self._concept_cache[concept_id] = concept
+            return concept
         return None
-    
+
     def update_concept_mastery(self, concept_id: int, correct: bool, hints_used: int = 0):
-        """Update concept mastery based on performance"""
-        concept = self.get_concept(concept_id)
-        if not concept:
-            return
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Update mastery level based on performance
-        if correct and hints_used == 0:
-            concept.correct_streak += 1
-            if concept.correct_streak >= 3 and concept.mastery_level.value < MasteryLevel.MASTERED.value:
-                concept.mastery_level = MasteryLevel(concept.mastery_level.value + 1)
-        else:
-            concept.correct_streak = 0
-            if concept.mastery_level.value > MasteryLevel.LEARNING.value:
-                concept.mastery_level = MasteryLevel(concept.mastery_level.value - 1)
-        
-        # Calculate next review time using spaced repetition
-        now = datetime.datetime.now()
-        if correct:
-            # Increase interval based on mastery level
-            intervals = {
-                MasteryLevel.UNKNOWN: 1,
-                MasteryLevel.LEARNING: 2,
-                MasteryLevel.FAMILIAR: 4,
-                MasteryLevel.PROFICIENT: 7,
-                MasteryLevel.MASTERED: 14
-            }
-            days_to_add = intervals[concept.mastery_level]
-        else:
-            # Review again soon if incorrect
-            days_to_add = 1
-        
-        next_review = now + datetime.timedelta(days=days_to_add)
-        
-        cursor.execute('''
-            UPDATE concepts 
-            SET mastery_level = ?, last_reviewed = ?, next_review = ?, 
-                review_count = ?, correct_streak = ?
-            WHERE id = ?
-        ''', (
-            concept.mastery_level.value,
-            now.isoformat(),
-            next_review.isoformat(),
-            concept.review_count + 1,
-            concept.correct_streak,
-            concept_id
-        ))
-        
-        conn.commit()
-        conn.close()
-    
+        """Update FSRS scheduler state and mastery based on performance"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            # Narrow read of just the columns the update needs — no datetime
+            # parsing or full Concept construction on the hot answer path
+            row = cursor.execute('''
+                SELECT mastery_level, correct_streak, review_count,
+                       last_reviewed_ts, stability, difficulty
+                FROM concepts WHERE id = ?
+            ''', (concept_id,)).fetchone()
+            if row is None:
+                return
+            (mastery_level, correct_streak, review_count,
+             last_reviewed_ts, stability, difficulty) = row
+
+            now = datetime.datetime.now()
+            now_ts = int(now.timestamp())
+
+            # Seed state for rows written before the FSRS columns existed
+            if stability is None:
+                stability = float(_INTERVALS[mastery_level])
+            if difficulty is None:
+                difficulty = 5.0
+
+            # A clean answer counts as recall; hints or a miss count as a lapse
+            recalled = correct and hints_used == 0
+            elapsed_days = max((now_ts - last_reviewed_ts) / 86400.0, 0.0) if last_reviewed_ts else 0.0
+            if elapsed_days < 1.0:
+                stability = _fsrs_short_term_stability(stability, recalled)
+            else:
+                retrievability = _fsrs_retrievability(elapsed_days, stability)
+                stability = _fsrs_next_stability(stability, difficulty, retrievability, recalled)
+            difficulty = _fsrs_next_difficulty(difficulty, recalled)
+
+            correct_streak = correct_streak + 1 if recalled else 0
+            mastery_level = _mastery_from_stability(stability)
+
+            # Schedule the next review where retrievability is predicted to
+            # decay to the target retention (equals `stability` days at 90%)
+            days_to_add = max(9.0 * stability * (1.0 / _FSRS_TARGET_RETENTION - 1.0), 1.0)
+            next_review = now + datetime.timedelta(days=days_to_add)
+
+            cursor.execute('''
+                UPDATE concepts
+                SET mastery_level = ?, last_reviewed = ?, next_review = ?,
+                    last_reviewed_ts = ?, next_review_ts = ?,
+                    review_count = ?, correct_streak = ?,
+                    stability = ?, difficulty = ?
+                WHERE id = ?
+            ''', (
+                mastery_level,
+                now.isoformat(),
+                next_review.isoformat(),
+                now_ts,
+                int(next_review.timestamp()),
+                review_count + 1,
+                correct_streak,
+                stability,
+                difficulty,
+                concept_id
+            ))
+        self._invalidate_cache(concept_id)
+
     def update_concept_review_time(self, concept_id: int, review_time: datetime.datetime):
         """Update the next_review time for a concept"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE concepts 
-            SET next_review = ?
-            WHERE id = ?
-        ''', (review_time.isoformat(), concept_id))
-        
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.cursor().execute('''
+                UPDATE concepts
+                SET next_review = ?, next_review_ts = ?
+                WHERE id = ?
+            ''', (review_time.isoformat(), int(review_time.timestamp()), concept_id))
+        self._invalidate_cache(concept_id)
     
-    def get_concepts_due_for_review(self) -> List[Concept]:
-        """Get concepts that are due for review"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        now = datetime.datetime.now().isoformat()
-        cursor.execute('''
-            SELECT * FROM concepts 
-            WHERE next_review <= ? OR review_count = 0
-            ORDER BY mastery_level ASC, next_review ASC
-        ''', (now,))
-        
-        concepts = []
-        for row in cursor.fetchall():
-            concepts.append(Concept(
-                id=row[0],
-                name=row[1],
-                content=row[2],
-                mastery_level=MasteryLevel(row[3]),
-                last_reviewed=datetime.datetime.fromisoformat(row[4]) if row[4] else datetime.datetime.now(),
-                next_review=datetime.datetime.fromisoformat(row[5]) if row[5] else datetime.datetime.now(),
-                review_count=row[6],
-                correct_streak=row[7],
-                difficulty_level=DifficultyLevel(row[8])
-            ))
-        
-        conn.close()
+    def get_concepts_due_for_review(self, limit: Optional[int] = None) -> List[Concept]:
+        """Get concepts that are due for review, optionally capped at `limit`"""
+        cached = self._due_cache.get(limit)
+        if cached is not None:
+            return cached
+
+        # Integer comparison against the epoch column uses idx_concepts_due_ts
+        # without any TEXT collation work
+        now_ts = int(time.time())
+        if limit is not None:
+            sql, params = self._SQL_DUE_LIMITED, [now_ts, limit]
+        else:
+            sql, params = self._SQL_DUE, [now_ts]
+
+        with self._lock:
+            rows = self._conn.cursor().execute(sql, params).fetchall()
+
+        concepts = [self._row_to_concept(row) for row in rows]
+
+        self._due_cache[limit] = concepts
         return concepts
-    
-    def record_review_session(self, concept_id: int, question: str, user_answer: str, 
+
+    def record_review_session(self, concept_id: int, question: str, user_answer: str,
                             correct: bool, hints_used: int = 0, follow_up_questions: int = 0,
                             weakness_identified: bool = False, conversation_data: str = ""):
         """Record a review session with enhanced tracking"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO review_sessions (concept_id, question, user_answer, correct, timestamp, 
-                                       hints_used, follow_up_questions, weakness_identified, conversation_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (concept_id, question, user_answer, correct, datetime.datetime.now().isoformat(), 
-              hints_used, follow_up_questions, weakness_identified, conversation_data))
-        
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.cursor().execute('''
+                INSERT INTO review_sessions (concept_id, question, user_answer, correct, timestamp,
+                                           hints_used, follow_up_questions, weakness_identified, conversation_data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (concept_id, question, user_answer, correct, datetime.datetime.now().isoformat(),
+                  hints_used, follow_up_questions, weakness_identified, conversation_data))
     
+    def finalize_answer(self, concept_id: int, question: str, user_answer: str,
+                        correct: bool, hints_used: int = 0):
+        """Record a review session and update mastery with a single commit
+        instead of one fsync per statement"""
+        with self.transaction():
+            self.record_review_session(concept_id, question, user_answer, correct, hints_used)
+            self.update_concept_mastery(concept_id, correct, hints_used)
+
     def add_concept_weakness(self, concept_id: int, weakness_area: str, severity: int = 1):
-        """Track specific weakness areas for a concept"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Check if this weakness already exists
-        cursor.execute('''
-            SELECT id, times_encountered FROM concept_weaknesses 
-            WHERE concept_id = ? AND weakness_area = ?
-        ''', (concept_id, weakness_area))
-        
-        existing = cursor.fetchone()
-        if existing:
-            # Update existing weakness
-            cursor.execute('''
-                UPDATE concept_weaknesses 
-                SET times_encountered = times_encountered + 1, 
-                    last_encountered = ?, severity = ?
-                WHERE id = ?
-            ''', (datetime.datetime.now().isoformat(), severity, existing[0]))
-        else:
-            # Add new weakness
-            cursor.execute('''
+        """Track a single weakness area for a concept"""
+        self.add_concept_weaknesses(concept_id, [weakness_area], severity)
+
+    def add_concept_weaknesses(self, concept_id: int, weakness_areas: List[str],
+                               severity: int = 1, now_iso: Optional[str] = None):
+        """Track several weakness areas with one UPSERT batch and one commit;
+        callers batching several groups can pass a shared now_iso"""
+        if not weakness_areas:
+            return
+        now = now_iso or datetime.datetime.now().isoformat()
+        with self.transaction() as conn:
+            conn.cursor().executemany('''
                 INSERT INTO concept_weaknesses (concept_id, weakness_area, severity, last_encountered)
                 VALUES (?, ?, ?, ?)
-            ''', (concept_id, weakness_area, severity, datetime.datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
-    
+                ON CONFLICT(concept_id, weakness_area) DO UPDATE SET
+                    times_encountered = times_encountered + 1,
+                    last_encountered = excluded.last_encountered,
+                    severity = excluded.severity
+            ''', [(concept_id, area, severity, now) for area in weakness_areas])
+
+    def get_weaknesses_for_concepts(self, concept_ids: List[int]) -> Dict[int, List[Dict]]:
+        """Get tracked weaknesses for multiple concepts in one query"""
+        weaknesses_by_id = {concept_id: [] for concept_id in concept_ids}
+        if not concept_ids:
+            return weaknesses_by_id
+
+        placeholders = ','.join('?' * len(concept_ids))
+        with self._lock:
+            rows = self._conn.cursor().execute(f'''
+                SELECT concept_id, weakness_area, severity, times_encountered, last_encountered
+                FROM concept_weaknesses
+                WHERE concept_id IN ({placeholders})
+                ORDER BY severity DESC, times_encountered DESC
+            ''', concept_ids).fetchall()
+
+        for row in rows:
+            weaknesses_by_id[row[0]].append({
+                'area': row[1],
+                'severity': row[2],
+                'times_encountered': row[3],
+                'last_encountered': row[4]
+            })
+
+        return weaknesses_by_id
+
     def get_concept_weaknesses(self, concept_id: int) -> List[Dict]:
         """Get tracked weaknesses for a concept"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT weakness_area, severity, times_encountered, last_encountered
-            FROM concept_weaknesses 
-            WHERE concept_id = ?
-            ORDER BY severity DESC, times_encountered DESC
-        ''', (concept_id,))
-        
+        with self._lock:
+            rows = self._conn.cursor().execute('''
+                SELECT weakness_area, severity, times_encountered, last_encountered
+                FROM concept_weaknesses
+                WHERE concept_id = ?
+                ORDER BY severity DESC, times_encountered DESC
+            ''', (concept_id,)).fetchall()
+
         weaknesses = []
-        for row in cursor.fetchall():
+        for row in rows:
             weaknesses.append({
                 'area': row[0],
                 'severity': row[1],
                 'times_encountered': row[2],
                 'last_encountered': row[3]
             })
-        
-        conn.close()
+
         return weaknesses
 
+# Stable per-concept system text shared by every conversational call; built
+# once so the bytes are identical across calls, which is what Anthropic's
+# prompt cache keys on
+@functools.lru_cache(maxsize=64)
+def _tutor_system_text(name: str, content: str) -> str:
+    return f"""You are a patient, encouraging tutor helping a student master {name} through active recall. Ground every answer, hint and question in the study material below.
+
+Study Material for reference:
+{content}"""
+
+# Prompt templates are pure functions of their string arguments, so repeated
+# tries against the same concept/section reuse the built prompt instead of
+# re-concatenating KB-sized content into a fresh f-string each time
+@functools.lru_cache(maxsize=128)
+def _build_question_prompt(name: str, content: str, question_type: str,
+                           difficulty_name: str) -> str:
+    return f"""
+Based on the following study material about {name}, generate a {question_type} question at {difficulty_name.lower()} difficulty level.
+
+Study Material:
+{content}
+
+Question Type Guidelines:
+- Recall: Test basic understanding and memory of facts
+- Application: Test ability to apply concepts to new situations
+- Synthesis: Test ability to combine concepts and create new understanding
+
+Difficulty Guidelines:
+- Basic: Fundamental concepts and definitions
+- Intermediate: Connections between concepts and simple applications
+- Advanced: Complex applications and analysis
+- Expert: Creative synthesis and advanced problem-solving
+
+Please format your response as:
+Question: [Your question here]
+Expected Answer: [Brief expected answer or key points]
+"""
+
+@functools.lru_cache(maxsize=128)
+def _build_notes_question_prompt(title: str, content: str, question_type: str,
+                                 difficulty_name: str) -> str:
+    return f"""
+You are creating a targeted study question about: {title}
+
+Notes content for this section:
+{content}
+
+Question type: {question_type}
+Difficulty: {difficulty_name}
+
+Generate a focused, specific question that:
+1. Tests understanding of ONE key concept from this section
+2. Is appropriate for {difficulty_name.lower()} level
+3. Can be answered directly from the notes content
+4. Avoids generic "what can you tell me about..." phrasing
+5. Focuses on specific facts, definitions, or concepts
+
+Examples of good targeted questions:
+- For basic recall: "What are the main components of X?" "Why does Y happen?" "What is the time complexity of Z?"
+- For understanding: "How does X differ from Y?" "When would you use Z instead of W?"
+
+Format your response as:
+Question: [specific, targeted question]
+Expected Answer: [brief answer based on the notes]
+
+Focus on creating a question that tests specific knowledge from this section.
+"""
+
 class ClaudeQuestionGenerator:
-    def __init__(self, api_key: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
-    
+    # Keep-alive pool sized for a burst of a few parallel calls; reusing the
+    # warm TCP+TLS session saves the handshake on every per-turn request
+    _HTTP_LIMITS = httpx.Limits(max_keepalive_connections=8, max_connections=16,
+                                keepalive_expiry=60)
+    _HTTP_TIMEOUT = httpx.Timeout(connect=2.0, read=15.0, write=5.0, pool=2.0)
+
+    # Per-turn prompt templates built once at class scope; each call only
+    # substitutes the small dynamic slots instead of re-formatting the
+    # static instruction text, and the static parts stay byte-identical
+    # run to run (which prompt caching depends on)
+    _EVAL_TMPL = """
+Question: {question}
+Expected Answer: {expected}
+User's Answer: {answer}
+
+Please evaluate the user's answer and provide:
+1. A score (Correct/Partially Correct/Incorrect)
+2. Brief feedback explaining what was right or wrong
+3. Up to 3 hints to guide them toward the correct answer if needed
+
+Format your response as:
+Score: [Correct/Partially Correct/Incorrect]
+Feedback: [Your feedback]
+Hints: [Hint 1] | [Hint 2] | [Hint 3]
+"""
+
+    _TURN_TMPL = """
+The student was asked: {question}{summary_text}
+Expected answer: {expected}
+The student answered: "{answer}"
+
+Recent conversation:
+{history_text}
+
+Evaluate the answer and respond ONLY as JSON with these keys:
+- correct (bool): whether the answer is correct or mostly correct
+- feedback (str): one sentence on what was right or wrong
+- hints (list of str): up to 3 hints if the answer was lacking, else []
+- guiding_response (str): your next tutor message, 1-2 sentences — if correct, acknowledge it and ask ONE new follow-up question not already asked; if not, give one gentle hint phrased like "think about..." or "consider..."
+- weaknesses (list of str): up to 3 specific weakness areas if incorrect (e.g. "definitions and terminology", "time complexity understanding"), else []
+"""
+
+    _GUIDE_TRANSITION_TMPL = """
+The student gave a correct answer about {name}: "{answer}"
+
+Recent conversation:
+{history_text}
+
+The student has demonstrated understanding of this aspect. Generate a response that:
+1. Acknowledges they're correct
+2. Smoothly transitions to a NEW related topic/aspect of {name}
+3. Clearly indicates the topic shift (e.g., "Great! Now let's explore..." or "Perfect! Moving on to...")
+4. Asks ONE question about the new topic
+5. Keep it conversational and encouraging
+
+Respond in 2-3 sentences maximum as a tutor.
+"""
+
+    _GUIDE_CORRECT_TMPL = """
+The student gave a correct answer about {name}: "{answer}"
+
+Recent conversation:
+{history_text}
+
+Generate a brief, encouraging response that:
+1. Acknowledges they're correct
+2. Asks ONE NEW follow-up question (different from previous questions)
+3. Keeps it conversational and brief
+4. Don't repeat questions already asked in the conversation
+
+Respond in 1-2 sentences maximum as a tutor.
+"""
+
+    _GUIDE_HINT_TMPL = """
+The student gave an incomplete answer about {name}: "{answer}"
+
+Recent conversation:
+{history_text}
+
+Generate a brief, gentle hint that:
+1. Focuses on ONE specific aspect they should think about
+2. Uses a phrase like "think about..." or "consider..."
+3. Doesn't repeat previous hints from the conversation
+4. Is supportive but concise
+
+Respond in 1-2 sentences maximum as a helpful tutor.
+"""
+
+    def __init__(self, api_key: str, db: Optional[ActiveRecallDatabase] = None):
+        self.client = anthropic.Anthropic(
+            api_key=api_key,
+            http_client=httpx.Client(limits=self._HTTP_LIMITS, timeout=self._HTTP_TIMEOUT)
+        )
+        self.async_client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(limits=self._HTTP_LIMITS, timeout=self._HTTP_TIMEOUT)
+        )
+        self.db = db
+
+    @staticmethod
+    def _cached_system(concept: Concept) -> List[Dict]:
+        """System block carrying the tutor preamble and study material with
+        cache_control, so repeat calls for the same concept within the cache
+        window only pay for the short per-turn user message"""
+        return [{
+            "type": "text",
+            "text": _tutor_system_text(concept.name, concept.content),
+            "cache_control": {"type": "ephemeral"},
+        }]
+
+    @staticmethod
+    def _question_cache_key(*parts) -> str:
+        """Hash the inputs that determine a generated question"""
+        h = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            h.update(str(part).encode('utf-8'))
+            h.update(b'\x00')
+        return h.hexdigest()
+
+    def _get_cached_question(self, key: str, concept_id: int) -> Optional[Question]:
+        """Return a previously generated question for this key, if any"""
+        if not self.db:
+            return None
+        payload = self.db.get_cached_question(key)
+        if not payload:
+            return None
+        data = json.loads(payload)
+        return Question(
+            concept_id=concept_id,
+            question_text=data['question_text'],
+            expected_answer=data['expected_answer'],
+            difficulty=DifficultyLevel(data['difficulty']),
+            question_type=data['question_type']
+        )
+
+    def _store_cached_question(self, key: str, question: Question):
+        if not self.db:
+            return
+        self.db.cache_question(key, json.dumps({
+            'question_text': question.question_text,
+            'expected_answer': question.expected_answer,
+            'difficulty': question.difficulty.value,
+            'question_type': question.question_type
+        }))
+
     def generate_question(self, concept: Concept) -> Question:
         """Generate a question based on the concept's notes structure and current progress"""
         
@@ -364,13 +1010,23 @@ class ClaudeQuestionGenerator:
             question_type = "synthesis"
             difficulty = DifficultyLevel.EXPERT
         
+        # Reuse a cached generation for identical content/type/difficulty
+        cache_key = self._question_cache_key(
+            concept.content_hash or concept.content,
+            question_type, difficulty.value, concept.mastery_level.value
+        )
+        cached = self._get_cached_question(cache_key, concept.id)
+        if cached:
+            return cached
+
         prompt = self._create_question_prompt(concept, question_type, difficulty)
-        
+
         try:
             print(f"🔍 DEBUG: Calling Claude API for {concept.name}")
             response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=500,
+                model=MODEL_FAST,
+                max_tokens=LIMITS["gen"],
+                temperature=0.0,
                 messages=[{"role": "user", "content": prompt}]
             )
             
@@ -378,35 +1034,26 @@ class ClaudeQuestionGenerator:
             content = response.content[0].text
             print(f"🔍 DEBUG: Claude response: {content}")
             
-            lines = content.strip().split('\n')
-            
-            question_text = ""
-            expected_answer = ""
-            
-            for i, line in enumerate(lines):
-                if line.startswith("Question:"):
-                    question_text = line.replace("Question:", "").strip()
-                elif line.startswith("Expected Answer:"):
-                    expected_answer = line.replace("Expected Answer:", "").strip()
-                    # Include any additional lines as part of the answer
-                    if i + 1 < len(lines):
-                        expected_answer += " " + " ".join(lines[i+1:])
-                    break
-            
+            fields = _parse_labeled(content)
+            question_text = fields.get("Question", "")
+            expected_answer = fields.get("Expected Answer", "")
+
             if not question_text:
                 print("🔍 DEBUG: No question found in Claude response")
                 question_text = f"What can you tell me about {concept.name}?"
             else:
                 print(f"🔍 DEBUG: Successfully generated question: {question_text}")
-            
-            return Question(
+
+            question = Question(
                 concept_id=concept.id,
                 question_text=question_text,
                 expected_answer=expected_answer or "Basic understanding expected",
                 difficulty=difficulty,
                 question_type=question_type
             )
-            
+            self._store_cached_question(cache_key, question)
+            return question
+
         except Exception as e:
             print(f"🔍 DEBUG: Exception in question generation: {str(e)}")
             # Fallback question when API fails
@@ -417,7 +1064,95 @@ class ClaudeQuestionGenerator:
                 difficulty=DifficultyLevel.BASIC,
                 question_type="basic"
             )
-    
+
+    async def generate_questions_batch(self, concepts: List[Concept]) -> List[Question]:
+        """Generate questions for several concepts concurrently.
+
+        Cache hits are answered immediately; the remaining prompts go out
+        through the async client with at most 8 requests in flight, so a
+        batch takes about as long as its slowest call instead of the sum.
+        """
+        semaphore = asyncio.Semaphore(8)
+
+        async def generate_one(concept: Concept) -> Question:
+            # Section/difficulty selection and the cache lookup are cheap and
+            # synchronous; only the API call itself is awaited
+            if concept.notes_sections and len(concept.notes_sections) > 0:
+                section = self._get_current_focus_section(concept)
+                if self._should_review_previous_sections(concept):
+                    section = self._pick_review_section(concept) or section
+
+                if section.mastery_level == MasteryLevel.UNKNOWN:
+                    question_type, difficulty = "basic_recall", DifficultyLevel.BASIC
+                elif section.mastery_level == MasteryLevel.LEARNING:
+                    question_type, difficulty = "understanding", DifficultyLevel.BASIC
+                elif section.mastery_level == MasteryLevel.FAMILIAR:
+                    question_type, difficulty = "application", DifficultyLevel.INTERMEDIATE
+                else:
+                    question_type, difficulty = "synthesis", DifficultyLevel.ADVANCED
+
+                cache_key = self._question_cache_key(
+                    section.content, section.section_id, question_type, difficulty.value
+                )
+                prompt = self._create_notes_question_prompt(concept, section, question_type, difficulty)
+                fallback_text = f"What can you tell me about {section.title.lower()}?"
+                final_type = f"{question_type}_{section.section_id}"
+            else:
+                if concept.mastery_level in [MasteryLevel.UNKNOWN, MasteryLevel.LEARNING]:
+                    question_type, difficulty = "recall", DifficultyLevel.BASIC
+                elif concept.mastery_level == MasteryLevel.FAMILIAR:
+                    question_type = random.choice(["recall", "application"])
+                    difficulty = DifficultyLevel.INTERMEDIATE
+                elif concept.mastery_level == MasteryLevel.PROFICIENT:
+                    question_type = random.choice(["application", "synthesis"])
+                    difficulty = DifficultyLevel.ADVANCED
+                else:  # MASTERED
+                    question_type, difficulty = "synthesis", DifficultyLevel.EXPERT
+
+                cache_key = self._question_cache_key(
+                    concept.content_hash or concept.content,
+                    question_type, difficulty.value, concept.mastery_level.value
+                )
+                prompt = self._create_question_prompt(concept, question_type, difficulty)
+                fallback_text = f"What can you tell me about {concept.name}?"
+                final_type = question_type
+
+            cached = self._get_cached_question(cache_key, concept.id)
+            if cached:
+                return cached
+
+            try:
+                async with semaphore:
+                    response = await self.async_client.messages.create(
+                        model=MODEL_FAST,
+                        max_tokens=LIMITS["gen"],
+                        temperature=0.0,
+                        messages=[{"role": "user", "content": prompt}]
+                    )
+
+                fields = _parse_labeled(response.content[0].text)
+                question = Question(
+                    concept_id=concept.id,
+                    question_text=fields.get("Question", "") or fallback_text,
+                    expected_answer=fields.get("Expected Answer", "") or "Basic understanding expected",
+                    difficulty=difficulty,
+                    question_type=final_type
+                )
+                self._store_cached_question(cache_key, question)
+                return question
+
+            except Exception:
+                # Same fallback as the synchronous path
+                return Question(
+                    concept_id=concept.id,
+                    question_text=fallback_text,
+                    expected_answer="Basic understanding expected",
+                    difficulty=DifficultyLevel.BASIC,
+                    question_type=final_type
+                )
+
+        return list(await asyncio.gather(*(generate_one(c) for c in concepts)))
+
     def _generate_notes_based_question(self, concept: Concept) -> Question:
         """Generate questions based on structured notes with progressive difficulty"""
         
@@ -447,35 +1182,38 @@ class ClaudeQuestionGenerator:
             question_type = "synthesis"
             difficulty = DifficultyLevel.ADVANCED
         
+        # Reuse a cached generation for identical section/type/difficulty
+        cache_key = self._question_cache_key(
+            current_section.content, current_section.section_id, question_type, difficulty.value
+        )
+        cached = self._get_cached_question(cache_key, concept.id)
+        if cached:
+            return cached
+
         prompt = self._create_notes_question_prompt(concept, current_section, question_type, difficulty)
-        
+
         try:
             response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=300,
+                model=MODEL_FAST,
+                max_tokens=LIMITS["gen"],
+                temperature=0.0,
                 messages=[{"role": "user", "content": prompt}]
             )
-            
-            content = response.content[0].text
-            lines = content.strip().split('\n')
-            
-            question_text = ""
-            expected_answer = ""
-            
-            for line in lines:
-                if line.startswith("Question:"):
-                    question_text = line.replace("Question:", "").strip()
-                elif line.startswith("Expected Answer:"):
-                    expected_answer = line.replace("Expected Answer:", "").strip()
-            
-            return Question(
+
+            fields = _parse_labeled(response.content[0].text)
+            question_text = fields.get("Question", "")
+            expected_answer = fields.get("Expected Answer", "")
+
+            question = Question(
                 concept_id=concept.id,
                 question_text=question_text or f"What can you tell me about {current_section.title.lower()}?",
                 expected_answer=expected_answer or "Basic understanding expected",
                 difficulty=difficulty,
                 question_type=f"{question_type}_{current_section.section_id}"
             )
-            
+            self._store_cached_question(cache_key, question)
+            return question
+
         except Exception as e:
             # Fallback question
             return Question(
@@ -485,20 +1223,23 @@ class ClaudeQuestionGenerator:
                 difficulty=DifficultyLevel.BASIC,
                 question_type=f"basic_{current_section.section_id}"
             )
-    
+
     def _get_current_focus_section(self, concept: Concept) -> NotesSection:
         """Get the section to focus on based on progress"""
-        
-        # Find the first section that isn't mastered, or return current index
-        for i, section in enumerate(concept.notes_sections):
-            if section.mastery_level != MasteryLevel.MASTERED:
-                concept.current_section_index = i
-                return section
-        
-        # If all sections are mastered, cycle through them
-        concept.current_section_index = concept.current_section_index % len(concept.notes_sections)
-        return concept.notes_sections[concept.current_section_index]
-    
+
+        # First section that isn't mastered ('is not' — enum members are
+        # singletons, so identity beats Enum.__eq__); if all are mastered,
+        # cycle through them
+        index = next(
+            (i for i, section in enumerate(concept.notes_sections)
+             if section.mastery_level is not MasteryLevel.MASTERED),
+            None
+        )
+        if index is None:
+            index = concept.current_section_index % len(concept.notes_sections)
+        concept.current_section_index = index
+        return concept.notes_sections[index]
+
     def _should_review_previous_sections(self, concept: Concept) -> bool:
         """Decide if we should review previous sections (spaced repetition)"""
         
@@ -514,204 +1255,171 @@ class ClaudeQuestionGenerator:
         if not available_sections:
             return None
         
-        # Prefer sections that haven't been studied recently or have lower mastery
-        weights = []
-        for section in available_sections:
-            weight = 1.0
-            if section.mastery_level == MasteryLevel.UNKNOWN:
-                weight = 3.0
-            elif section.mastery_level == MasteryLevel.LEARNING:
-                weight = 2.0
-            elif section.mastery_level == MasteryLevel.FAMILIAR:
-                weight = 1.5
-            weights.append(weight)
-        
-        return random.choices(available_sections, weights=weights)[0]
+        # Prefer sections that haven't been studied recently or have lower
+        # mastery; weighted sampling via a cumulative-weight table (what
+        # random.choices does internally, minus the argument validation)
+        cum_weights = list(itertools.accumulate(
+            _MASTERY_WEIGHT.get(section.mastery_level, 1.0)
+            for section in available_sections
+        ))
+        index = bisect.bisect_right(cum_weights, random.random() * cum_weights[-1])
+        return available_sections[index]
     
-    def _create_notes_question_prompt(self, concept: Concept, section: NotesSection, 
+    def _create_notes_question_prompt(self, concept: Concept, section: NotesSection,
                                     question_type: str, difficulty: DifficultyLevel) -> str:
         """Create a prompt for generating questions based on notes sections"""
-        
-        prompt = f"""
-You are creating a targeted study question about: {section.title}
+        return _build_notes_question_prompt(section.title, section.content,
+                                            question_type, difficulty.name)
 
-Notes content for this section:
-{section.content}
+    def _create_question_prompt(self, concept: Concept, question_type: str, difficulty: DifficultyLevel) -> str:
+        """Create a prompt for generating questions"""
+        return _build_question_prompt(concept.name, concept.content,
+                                      question_type, difficulty.name)
 
-Question type: {question_type}
-Difficulty: {difficulty.name}
+    @staticmethod
+    def _normalize_answer(user_answer: str) -> str:
+        """Lowercase and collapse whitespace so trivially different phrasings
+        of the same answer share one cache entry"""
+        return ' '.join(user_answer.lower().split())
 
-Generate a focused, specific question that:
-1. Tests understanding of ONE key concept from this section
-2. Is appropriate for {difficulty.name.lower()} level  
-3. Can be answered directly from the notes content
-4. Avoids generic "what can you tell me about..." phrasing
-5. Focuses on specific facts, definitions, or concepts
+    def evaluate_answer(self, question: Question, user_answer: str) -> Tuple[bool, str, List[str]]:
+        """Evaluate user's answer and provide feedback"""
+        # Empty / "idk"-style replies don't need a model to grade
+        if _trivial_non_answer(user_answer):
+            return (False, "That's okay — let's break it down.",
+                    ["Think about the core property first."])
 
-Examples of good targeted questions:
-- For basic recall: "What are the main components of X?" "Why does Y happen?" "What is the time complexity of Z?"
-- For understanding: "How does X differ from Y?" "When would you use Z instead of W?"
+        # Re-grading the same answer to the same question is deterministic at
+        # temperature 0, so serve repeats from the response cache
+        cache_key = self._question_cache_key(
+            'eval', question.question_text, question.expected_answer,
+            self._normalize_answer(user_answer)
+        )
+        if self.db:
+            payload = self.db.get_cached_question(cache_key)
+            if payload:
+                data = json.loads(payload)
+                return data['correct'], data['feedback'], data['hints']
 
-Format your response as:
-Question: [specific, targeted question]
-Expected Answer: [brief answer based on the notes]
+        prompt = self._EVAL_TMPL.format(
+            question=question.question_text,
+            expected=question.expected_answer,
+            answer=user_answer,
+        )
 
-Focus on creating a question that tests specific knowledge from this section.
-"""
-        
         try:
             response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=300,
+                model=MODEL_FAST,
+                max_tokens=LIMITS["qa"],
+                temperature=0.0,
                 messages=[{"role": "user", "content": prompt}]
             )
-            
-            content = response.content[0].text
-            lines = content.strip().split('\n')
-            
-            question_text = ""
-            expected_answer = ""
-            
-            for line in lines:
-                if line.startswith("Question:"):
-                    question_text = line.replace("Question:", "").strip()
-                elif line.startswith("Expected Answer:"):
-                    expected_answer = line.replace("Expected Answer:", "").strip()
-            
-            return Question(
-                concept_id=concept.id,
-                question_text=question_text or f"What can you tell me about {current_section.title.lower()}?",
-                expected_answer=expected_answer or "Basic understanding expected",
-                difficulty=difficulty,
-                question_type=f"{question_type}_{current_section.section_id}"
-            )
-            
-        except Exception as e:
-            # Fallback question
-            return Question(
-                concept_id=concept.id,
-                question_text=f"What can you tell me about {current_section.title.lower()}?",
-                expected_answer="Basic understanding expected",
-                difficulty=DifficultyLevel.BASIC,
-                question_type=f"basic_{current_section.section_id}"
-            )
-    
-    def _get_current_focus_section(self, concept: Concept) -> NotesSection:
-        """Get the section to focus on based on progress"""
-        
-        # Find the first section that isn't mastered, or return current index
-        for i, section in enumerate(concept.notes_sections):
-            if section.mastery_level != MasteryLevel.MASTERED:
-                concept.current_section_index = i
-                return section
-        
-        # If all sections are mastered, cycle through them
-        concept.current_section_index = concept.current_section_index % len(concept.notes_sections)
-        return concept.notes_sections[concept.current_section_index]
-    
-    def _should_review_previous_sections(self, concept: Concept) -> bool:
-        """Decide if we should review previous sections (spaced repetition)"""
-        
-        # 30% chance to review previous sections if we're past the first section
-        if concept.current_section_index > 0 and random.random() < 0.3:
-            return True
-        return False
-    
-    def _pick_review_section(self, concept: Concept) -> Optional[NotesSection]:
-        """Pick a previous section for review based on when it was last studied"""
-        
-        available_sections = concept.notes_sections[:concept.current_section_index]
-        if not available_sections:
-            return None
-        
-        # Prefer sections that haven't been studied recently or have lower mastery
-        weights = []
-        for section in available_sections:
-            weight = 1.0
-            if section.mastery_level == MasteryLevel.UNKNOWN:
-                weight = 3.0
-            elif section.mastery_level == MasteryLevel.LEARNING:
-                weight = 2.0
-            elif section.mastery_level == MasteryLevel.FAMILIAR:
-                weight = 1.5
-            weights.append(weight)
-        
-        return random.choices(available_sections, weights=weights)[0]
-    
-    def _create_question_prompt(self, concept: Concept, question_type: str, difficulty: DifficultyLevel) -> str:
-        """Create a prompt for generating questions"""
-        base_prompt = f"""
-Based on the following study material about {concept.name}, generate a {question_type} question at {difficulty.name.lower()} difficulty level.
-
-Study Material:
-{concept.content}
 
-Question Type Guidelines:
-- Recall: Test basic understanding and memory of facts
-- Application: Test ability to apply concepts to new situations
-- Synthesis: Test ability to combine concepts and create new understanding
+            fields = _parse_labeled(response.content[0].text)
+            score = fields.get("Score", "Incorrect")
+            feedback = fields.get("Feedback", "Unable to evaluate answer")
+            hints = [h.strip() for h in fields.get("Hints", "").split('|') if h.strip()]
 
-Difficulty Guidelines:
-- Basic: Fundamental concepts and definitions
-- Intermediate: Connections between concepts and simple applications
-- Advanced: Complex applications and analysis
-- Expert: Creative synthesis and advanced problem-solving
+            is_correct = score.lower() in ["correct", "partially correct"]
+            if self.db:
+                self.db.cache_question(cache_key, json.dumps({
+                    'correct': is_correct, 'feedback': feedback, 'hints': hints
+                }))
+            return is_correct, feedback, hints
 
-Please format your response as:
-Question: [Your question here]
-Expected Answer: [Brief expected answer or key points]
-"""
-        return base_prompt
+        except Exception as e:
+            return False, f"Error evaluating answer: {str(e)}", ["Try to be more specific", "Review the key concepts", "Think about the main principles"]
     
-    def evaluate_answer(self, question: Question, user_answer: str) -> Tuple[bool, str, List[str]]:
-        """Evaluate user's answer and provide feedback"""
+    def summarize_history(self, previous_summary: str,
+                          entries: List[Dict[str, str]]) -> str:
+        """Fold older conversation turns into a one-line rolling summary"""
+        transcript = "\n".join(f"{entry['role']}: {entry['content']}" for entry in entries)
         prompt = f"""
-Question: {question.question_text}
-Expected Answer: {question.expected_answer}
-User's Answer: {user_answer}
+Summary so far: {previous_summary or '(none)'}
 
-Please evaluate the user's answer and provide:
-1. A score (Correct/Partially Correct/Incorrect)
-2. Brief feedback explaining what was right or wrong
-3. Up to 3 hints to guide them toward the correct answer if needed
+New exchanges:
+{transcript}
 
-Format your response as:
-Score: [Correct/Partially Correct/Incorrect]
-Feedback: [Your feedback]
-Hints: [Hint 1] | [Hint 2] | [Hint 3]
+Update the summary to cover everything above in ONE short sentence focused on
+what the student has understood and struggled with. Respond with only the
+sentence.
 """
-        
         try:
             response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=400,
+                model=MODEL_FAST,
+                max_tokens=LIMITS["summary"],
+                temperature=0.0,
                 messages=[{"role": "user", "content": prompt}]
             )
-            
-            content = response.content[0].text
-            lines = content.strip().split('\n')
-            
-            score = "Incorrect"
-            feedback = "Unable to evaluate answer"
-            hints = []
-            
-            for line in lines:
-                if line.startswith("Score:"):
-                    score = line.replace("Score:", "").strip()
-                elif line.startswith("Feedback:"):
-                    feedback = line.replace("Feedback:", "").strip()
-                elif line.startswith("Hints:"):
-                    hints_text = line.replace("Hints:", "").strip()
-                    hints = [h.strip() for h in hints_text.split('|') if h.strip()]
-            
-            is_correct = score.lower() in ["correct", "partially correct"]
-            return is_correct, feedback, hints
-            
-        except Exception as e:
-            return False, f"Error evaluating answer: {str(e)}", ["Try to be more specific", "Review the key concepts", "Think about the main principles"]
-    
-    def generate_guiding_response(self, concept: Concept, user_answer: str, conversation_history: List[Dict[str, str]], 
-                                is_correct: bool) -> str:
+            return response.content[0].text.strip()
+        except Exception:
+            return previous_summary
+
+    def evaluate_and_guide(self, concept: Concept, question: Question, user_answer: str,
+                           conversation_history: List[Dict[str, str]],
+                           summary: str = "") -> Dict:
+        """Evaluate the answer, produce the guiding reply and identify
+        weaknesses in one Claude call returning structured JSON, instead of
+        the three sequential round trips a student turn used to cost"""
+        # Grade obvious non-answers locally and skip the round trip entirely
+        if _trivial_non_answer(user_answer):
+            return {
+                "correct": False,
+                "feedback": "That's okay — let's break it down.",
+                "hints": ["Think about the core property first."],
+                "guiding_response": (f"No problem — let's take it one step at a "
+                                     f"time. Think about the most basic property "
+                                     f"of {concept.name}: what is it for?"),
+                "weaknesses": ["recall confidence"],
+            }
+
+        history_text = "\n".join(f"{entry['role']}: {entry['content']}"
+                                 for entry in conversation_history[-3:])
+        summary_text = f"\nEarlier in the session: {summary}\n" if summary else ""
+        prompt = self._TURN_TMPL.format(
+            question=question.question_text,
+            summary_text=summary_text,
+            expected=question.expected_answer,
+            answer=user_answer,
+            history_text=history_text,
+        )
+
+        try:
+            response = self.client.messages.create(
+                model=MODEL_FAST,
+                max_tokens=LIMITS["turn"],
+                temperature=0.0,
+                system=self._cached_system(concept),
+                messages=[{"role": "user", "content": prompt}]
+            )
+
+            text = response.content[0].text
+            try:
+                data = json.loads(text)
+            except ValueError:
+                # Model wrapped the JSON in prose — grab the outermost braces
+                match = re.search(r'\{.*\}', text, re.DOTALL)
+                data = json.loads(match.group(0)) if match else {}
+
+            return {
+                "correct": bool(data.get("correct", False)),
+                "feedback": data.get("feedback", ""),
+                "hints": list(data.get("hints", [])),
+                "guiding_response": data.get("guiding_response")
+                    or f"What else can you tell me about {concept.name.lower()}?",
+                "weaknesses": list(data.get("weaknesses", [])),
+            }
+        except Exception:
+            return {
+                "correct": False,
+                "feedback": "",
+                "hints": [],
+                "guiding_response": f"Think about what makes {concept.name.lower()} special compared to other approaches.",
+                "weaknesses": ["general understanding"],
+            }
+
+    def generate_guiding_response(self, concept: Concept, user_answer: str, conversation_history: List[Dict[str, str]],
+                                is_correct: bool, stream_callback=None) -> str:
         """Generate a guiding response that encourages deeper thinking"""
         
         history_text = "\n".join([f"{entry['role']}: {entry['content']}" for entry in conversation_history[-3:]])
@@ -720,74 +1428,46 @@ Hints: [Hint 1] | [Hint 2] | [Hint 3]
             # Check if we should transition to a new topic
             should_transition = self._should_transition_topic(conversation_history, concept)
             
-            if should_transition:
-                prompt = f"""
-The student gave a correct answer about {concept.name}: "{user_answer}"
-
-Recent conversation:
-{history_text}
-
-The student has demonstrated understanding of this aspect. Generate a response that:
-1. Acknowledges they're correct
-2. Smoothly transitions to a NEW related topic/aspect of {concept.name}
-3. Clearly indicates the topic shift (e.g., "Great! Now let's explore..." or "Perfect! Moving on to...")
-4. Asks ONE question about the new topic
-5. Keep it conversational and encouraging
-
-Study Material for reference:
-{concept.content}
-
-Respond in 2-3 sentences maximum as a tutor.
-"""
-            else:
-                prompt = f"""
-The student gave a correct answer about {concept.name}: "{user_answer}"
-
-Recent conversation:
-{history_text}
-
-Generate a brief, encouraging response that:
-1. Acknowledges they're correct
-2. Asks ONE NEW follow-up question (different from previous questions)
-3. Keeps it conversational and brief
-4. Don't repeat questions already asked in the conversation
-
-Study Material for reference:
-{concept.content}
-
-Respond in 1-2 sentences maximum as a tutor.
-"""
+            template = (self._GUIDE_TRANSITION_TMPL if should_transition
+                        else self._GUIDE_CORRECT_TMPL)
         else:
-            prompt = f"""
-The student gave an incomplete answer about {concept.name}: "{user_answer}"
-
-Recent conversation:
-{history_text}
-
-Generate a brief, gentle hint that:
-1. Focuses on ONE specific aspect they should think about
-2. Uses a phrase like "think about..." or "consider..."
-3. Doesn't repeat previous hints from the conversation
-4. Is supportive but concise
-
-Study Material for reference:
-{concept.content}
-
-Respond in 1-2 sentences maximum as a helpful tutor.
-"""
+            template = self._GUIDE_HINT_TMPL
+        prompt = template.format(name=concept.name, answer=user_answer,
+                                 history_text=history_text)
         
         try:
+            if stream_callback:
+                # Stream tokens to the caller as they arrive so the user can
+                # start reading before generation finishes
+                parts = []
+                with self.client.messages.stream(
+                    model=MODEL_FAST,
+                    max_tokens=LIMITS["guide"],
+                    temperature=0.2,
+                    system=self._cached_system(concept),
+                    messages=[{"role": "user", "content": prompt}]
+                ) as stream:
+                    for text in stream.text_stream:
+                        parts.append(text)
+                        stream_callback(text)
+                return "".join(parts).strip()
+
             response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=100,
+                model=MODEL_FAST,
+                max_tokens=LIMITS["guide"],
+                temperature=0.2,
+                system=self._cached_system(concept),
                 messages=[{"role": "user", "content": prompt}]
             )
             return response.content[0].text.strip()
         except Exception as e:
             if is_correct:
-                return f"Good! What's one advantage of using {concept.name.lower()}?"
+                fallback = f"Good! What's one advantage of using {concept.name.lower()}?"
             else:
-                return f"Think about what makes {concept.name.lower()} special compared to other data structures."
+                fallback = f"Think about what makes {concept.name.lower()} special compared to other data structures."
+            if stream_callback:
+                stream_callback(fallback)
+            return fallback
     
     def _should_transition_topic(self, conversation_history: List[Dict[str, str]], concept: Concept) -> bool:
         """Determine if we should transition to a new topic based on conversation flow"""
@@ -835,11 +1515,13 @@ Respond with just the weakness areas, separated by commas.
         
         try:
             response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=150,
+                model=MODEL_FAST,
+                max_tokens=LIMITS["weakness"],
+                temperature=0.2,
+                system=self._cached_system(concept),
                 messages=[{"role": "user", "content": prompt}]
             )
-            
+
             weaknesses = [w.strip() for w in response.content[0].text.split(',')]
             return [w for w in weaknesses if w and len(w) > 3][:3]
         except Exception as e:
@@ -848,10 +1530,23 @@ Respond with just the weakness areas, separated by commas.
 class ActiveRecallSystem:
     def __init__(self, api_key: str, db_path: str = "active_recall.db"):
         self.db = ActiveRecallDatabase(db_path)
-        self.question_generator = ClaudeQuestionGenerator(api_key)
+        self.question_generator = ClaudeQuestionGenerator(api_key, db=self.db)
+        # Off-turn work (the rolling summary refresh) runs here so student
+        # turns never wait on it; weakness writes already go through the
+        # database's background writer queue
+        self._pool = ThreadPoolExecutor(max_workers=2)
+        self._summary_future: Optional[Future] = None
+        # Speculative (concept_id, Future[Question]) for the next due concept,
+        # generated while the student is still on the current one
+        self._prefetch: Optional[Tuple[int, Future]] = None
     
     def add_study_material(self, name: str, content: str) -> Concept:
-        """Add new study material as a concept"""
+        """Add new study material as a concept, reusing an existing row if
+        identical content was already added"""
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        existing_id = self.db.find_concept_by_hash(content_hash)
+        if existing_id is not None:
+            return self.db.get_concept(existing_id)
         concept_id = self.db.add_concept(name, content)
         return self.db.get_concept(concept_id)
     
@@ -873,15 +1568,12 @@ class ActiveRecallSystem:
         """Submit an answer and get feedback"""
         is_correct, feedback, hints = self.question_generator.evaluate_answer(question, user_answer)
         
-        # Record the session
+        # Record the session and update mastery in one transaction
         hints_used = 0  # This would be tracked in a real interactive session
-        self.db.record_review_session(
+        self.db.finalize_answer(
             concept.id, question.question_text, user_answer, is_correct, hints_used
         )
         
-        # Update concept mastery
-        self.db.update_concept_mastery(concept.id, is_correct, hints_used)
-        
         return {
             "correct": is_correct,
             "feedback": feedback,
@@ -896,20 +1588,40 @@ class ActiveRecallSystem:
         if not concept:
             raise ValueError(f"Concept {concept_id} not found")
         
+        # Use the speculatively generated question if it was for this concept
+        # (waiting on an in-flight one still beats issuing a fresh call)
+        question = None
+        if self._prefetch is not None:
+            prefetched_id, future = self._prefetch
+            self._prefetch = None
+            if prefetched_id == concept_id:
+                try:
+                    question = future.result()
+                except Exception:
+                    question = None
+
         # Generate initial question
-        question = self.question_generator.generate_question(concept)
+        if question is None:
+            question = self.question_generator.generate_question(concept)
         
         # Initialize conversation state
         conversation_state = ConversationState(
             concept_id=concept_id,
             original_question=question.question_text,
-            conversation_history=[
-                {"role": "tutor", "content": question.question_text}
-            ],
+            conversation_history=[],
             attempts=0,
             needs_remediation=False,
-            weakness_areas=self.db.get_concept_weaknesses(concept_id)
+            weakness_areas={w['area'] for w in self.db.get_concept_weaknesses(concept_id)}
         )
+        conversation_state.append_turn("tutor", question.question_text)
+
+        # Kick off the next due concept's question in the background so the
+        # following session starts without waiting on the API
+        upcoming = next((c for c in self.db.get_concepts_due_for_review()
+                         if c.id != concept_id), None)
+        if upcoming is not None:
+            self._prefetch = (upcoming.id, self._pool.submit(
+                self.question_generator.generate_question, upcoming))
         
         return conversation_state
     
@@ -918,17 +1630,13 @@ class ActiveRecallSystem:
         concept = self.db.get_concept(conversation_state.concept_id)
         
         # Add user question to conversation history
-        conversation_state.conversation_history.append({
-            "role": "student", 
-            "content": user_question
-        })
+        conversation_state.append_turn("student", user_question)
         
         # Generate an answer to their question using Claude
+        summary_text = (f"\nEarlier in the session: {conversation_state.summary}\n"
+                        if conversation_state.summary else "")
         prompt = f"""
-The student is asking a question about {concept.name}: "{user_question}"
-
-Study Material for reference:
-{concept.content}
+The student is asking a question about {concept.name}: "{user_question}"{summary_text}
 
 Conversation history:
 {chr(10).join([f"{entry['role']}: {entry['content']}" for entry in conversation_state.conversation_history[-3:]])}
@@ -945,28 +1653,24 @@ Follow-up: [A question to test their understanding]
         
         try:
             response = self.question_generator.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=400,
+                model=MODEL_FAST,
+                max_tokens=LIMITS["qa"],
+                temperature=0.2,
+                system=self.question_generator._cached_system(concept),
                 messages=[{"role": "user", "content": prompt}]
             )
             
             content = response.content[0].text
-            lines = content.strip().split('\n')
-            
-            answer = ""
-            follow_up = ""
-            
-            for line in lines:
-                if line.startswith("Answer:"):
-                    answer = line.replace("Answer:", "").strip()
-                elif line.startswith("Follow-up:"):
-                    follow_up = line.replace("Follow-up:", "").strip()
+            match = _ANS_RE.search(content)
+            if match:
+                answer = match.group('ans').strip()
+                follow_up = (match.group('fu') or '').strip()
+            else:
+                answer = content.strip()
+                follow_up = ""
             
             # Add tutor's answer to conversation history
-            conversation_state.conversation_history.append({
-                "role": "tutor",
-                "content": answer
-            })
+            conversation_state.append_turn("tutor", answer)
             
             return {
                 "answer": answer or "That's a great question! Let me explain...",
@@ -979,16 +1683,14 @@ Follow-up: [A question to test their understanding]
                 "follow_up_question": "What specific aspect would you like to explore further?"
             }
     
-    def continue_conversation(self, conversation_state: ConversationState, user_response: str) -> Dict:
+    def continue_conversation(self, conversation_state: ConversationState, user_response: str,
+                              stream_callback=None) -> Dict:
         """Continue the interactive conversation based on user response"""
         concept = self.db.get_concept(conversation_state.concept_id)
         conversation_state.attempts += 1
         
         # Add user response to conversation history
-        conversation_state.conversation_history.append({
-            "role": "student", 
-            "content": user_response
-        })
+        conversation_state.append_turn("student", user_response)
         
         # Evaluate the answer (but don't end conversation based on correctness)
         temp_question = Question(
@@ -999,31 +1701,49 @@ Follow-up: [A question to test their understanding]
             question_type="recall"
         )
         
-        is_correct, feedback, hints = self.question_generator.evaluate_answer(temp_question, user_response)
-        
-        # Generate guiding response instead of immediate feedback
-        guiding_response = self.question_generator.generate_guiding_response(
-            concept, user_response, conversation_state.conversation_history, is_correct
+        # Fold turns older than the verbatim window into the rolling summary
+        # in the background (at most one refresh in flight); this turn simply
+        # uses whatever summary is current
+        history = conversation_state.conversation_history
+        if (len(history) - conversation_state.summary_upto > 6
+                and (self._summary_future is None or self._summary_future.done())):
+            upto = len(history) - 4
+            chunk = history[conversation_state.summary_upto:upto]
+
+            def _refresh(state=conversation_state, chunk=chunk, upto=upto):
+                state.summary = self.question_generator.summarize_history(state.summary, chunk)
+                state.summary_upto = upto
+
+            self._summary_future = self._pool.submit(_refresh)
+
+        # One fused call evaluates, guides and spots weaknesses together
+        turn = self.question_generator.evaluate_and_guide(
+            concept, temp_question, user_response, history,
+            summary=conversation_state.summary
         )
-        
+        is_correct = turn["correct"]
+        guiding_response = turn["guiding_response"]
+        if stream_callback:
+            # The fused response arrives as one JSON blob, so the reply is
+            # delivered to the callback in a single chunk
+            stream_callback(guiding_response)
+
         # Track weaknesses if answer is incorrect
         if not is_correct:
-            weaknesses = self.question_generator.identify_weaknesses(
-                concept, user_response, temp_question.expected_answer
-            )
-            
-            # Track weaknesses in database
-            for weakness in weaknesses:
-                self.db.add_concept_weakness(concept.id, weakness, severity=1)
-            
-            conversation_state.weakness_areas.extend(weaknesses)
+            weaknesses = turn["weaknesses"] or ["general understanding"]
+
+            # Only areas not seen yet this session are queued; the writer's
+            # UPSERT handles cross-session repeats (the turn doesn't wait on
+            # the commit, end_conversation flushes first)
+            new_areas = [w for w in weaknesses
+                         if w not in conversation_state.weakness_areas]
+            if new_areas:
+                self.db.queue_concept_weaknesses(concept.id, new_areas, severity=1)
+                conversation_state.weakness_areas.update(new_areas)
             conversation_state.needs_remediation = True
         
         # Add tutor's guiding response to conversation history
-        conversation_state.conversation_history.append({
-            "role": "tutor",
-            "content": guiding_response
-        })
+        conversation_state.append_turn("tutor", guiding_response)
         
         # Always continue the conversation - never end automatically
         return {
@@ -1038,16 +1758,16 @@ Follow-up: [A question to test their understanding]
     def end_conversation(self, conversation_state: ConversationState) -> Dict:
         """End the conversation and record the session"""
         concept = self.db.get_concept(conversation_state.concept_id)
-        
+
         # Record the session
         self.db.record_review_session(
-            concept.id, conversation_state.original_question, 
+            concept.id, conversation_state.original_question,
             conversation_state.conversation_history[1]["content"],  # Original student answer
-            not conversation_state.needs_remediation, 0, conversation_state.attempts - 1, 
+            not conversation_state.needs_remediation, 0, conversation_state.attempts - 1,
             conversation_state.needs_remediation,
-            json.dumps(conversation_state.conversation_history)
+            conversation_state.serialized_history()
         )
-        
+
         # Update mastery based on overall performance
         if not conversation_state.needs_remediation and conversation_state.attempts <= 2:
             self.db.update_concept_mastery(concept.id, True, 0)
@@ -1056,13 +1776,28 @@ Follow-up: [A question to test their understanding]
             pass
         else:
             self.db.update_concept_mastery(concept.id, False, 0)
-        
+
         return {
             "status": "completed",
             "total_attempts": conversation_state.attempts,
             "remediation_needed": conversation_state.needs_remediation,
             "conversation_history": conversation_state.conversation_history
         }
+
+    def finalize_session(self, conversation_state: ConversationState) -> Dict:
+        """End the conversation and fetch the updated concept and weaknesses
+        in a single transaction instead of three separate round-trips"""
+        self.db.flush_writes()
+        with self.db.transaction():
+            end_result = self.end_conversation(conversation_state)
+            updated_concept = self.db.get_concept(conversation_state.concept_id)
+            weaknesses = self.db.get_concept_weaknesses(conversation_state.concept_id)
+
+        return {
+            "end_result": end_result,
+            "updated_concept": updated_concept,
+            "weaknesses": weaknesses
+        }
     
     def _evaluate_improvement(self, conversation_state: ConversationState, latest_response: str) -> bool:
         """Evaluate if the student is showing improvement in understanding"""
@@ -1071,40 +1806,34 @@ Follow-up: [A question to test their understanding]
         
         # Simple heuristic: longer, more detailed responses often indicate better understanding
         first_response = conversation_state.conversation_history[1]["content"]
-        
-        # Check for improvement indicators
+
+        # Check for improvement indicators: detail, technical reasoning words
+        # (one tokenize + set intersection instead of six substring scans),
+        # and structure
         improvement_indicators = [
-            len(latest_response) > len(first_response) * 1.2,  # More detailed response
-            any(word in latest_response.lower() for word in ["because", "since", "therefore", "complexity", "time", "space"]),  # Technical reasoning
-            latest_response.count('.') > first_response.count('.'),  # More structured explanation
+            len(latest_response) > len(first_response) * 1.2,
+            not _TECH_WORDS.isdisjoint(latest_response.lower().split()),
+            latest_response.count('.') > first_response.count('.'),
         ]
-        
+
         return sum(improvement_indicators) >= 2
     
     def get_study_progress(self) -> Dict:
         """Get overall study progress"""
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT mastery_level, COUNT(*) 
-            FROM concepts 
-            GROUP BY mastery_level
-        ''')
-        
-        mastery_distribution = {}
-        for row in cursor.fetchall():
-            mastery_distribution[MasteryLevel(row[0]).name] = row[1]
-        
-        cursor.execute('SELECT COUNT(*) FROM concepts')
-        total_concepts = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM concepts WHERE next_review <= ?', 
-                      (datetime.datetime.now().isoformat(),))
-        concepts_due = cursor.fetchone()[0]
-        
-        conn.close()
-        
+        # One grouped scan yields the distribution, the total and the due
+        # count together instead of three separate queries
+        with self.db.transaction() as conn:
+            rows = conn.cursor().execute('''
+                SELECT mastery_level, COUNT(*), SUM(next_review_ts <= ?)
+                FROM concepts
+                GROUP BY mastery_level
+            ''', (int(time.time()),)).fetchall()
+
+        mastery_distribution = {MasteryLevel(level).name: count
+                                for level, count, _ in rows}
+        total_concepts = sum(row[1] for row in rows)
+        concepts_due = sum(row[2] or 0 for row in rows)
+
         return {
             "total_concepts": total_concepts,
             "concepts_due_for_review": concepts_due,
@@ -1222,21 +1951,16 @@ Example Use Cases:
     
     # Add each note section as a separate reviewable concept
     # This ensures each section can be studied independently with proper priority
-    
-    # Add Linked Lists note sections as individual concepts (highest priority)
-    for i, section in enumerate(linked_list_notes):
-        concept_name = f"Linked Lists: {section.title}"
-        concept = system.add_study_material(concept_name, section.content)
-        # Set next_review to now so they're immediately available
-        system.db.update_concept_review_time(concept.id, datetime.datetime.now())
-    
-    # Add other concepts (lower priority)
-    arrays_concept = system.add_study_material("Arrays", array_content)
-    system.db.update_concept_review_time(arrays_concept.id, datetime.datetime.now())
-    
-    stacks_concept = system.add_study_material("Stacks", stack_content)
-    system.db.update_concept_review_time(stacks_concept.id, datetime.datetime.now())
-    
+    # All rows go in via one executemany transaction; next_review defaults to
+    # now, so everything is immediately available for review.
+    materials = [
+        (f"Linked Lists: {section.title}", section.content)
+        for section in linked_list_notes
+    ]
+    materials.append(("Arrays", array_content))
+    materials.append(("Stacks", stack_content))
+    system.db.add_concepts(materials)
+
     print("Dummy study materials added successfully!")
 
 if __name__ == "__main__":
@@ -1,5 +1,10 @@
 import sqlite3
+import hashlib
 import json
+import math
+import random
+import re
+import time
 import uuid
 from datetime import datetime, timedelta
 from enum import Enum
@@ -7,8 +12,17 @@ from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 from db import get_db
 import anthropic
+import httpx
 import os
 
+try:
+    # C-accelerated parser for model output when available; the stdlib
+    # decoder is the drop-in fallback so orjson stays an optional dep
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 class MasteryLevel(Enum):
     UNKNOWN = 0
     LEARNING = 1
@@ -22,7 +36,7 @@ class DifficultyLevel(Enum):
     ADVANCED = 3
     EXPERT = 4
 
-@dataclass
+@dataclass(slots=True)
 class Concept:
     id: str
     class_id: str
@@ -35,8 +49,11 @@ class Concept:
     correct_streak: int
     difficulty_level: DifficultyLevel
     created_at: datetime
+    # FSRS memory-model state driving the review schedule
+    stability: float = 2.0
+    difficulty: float = 5.0
 
-@dataclass
+@dataclass(slots=True)
 class Question:
     concept_id: str
     question_text: str
@@ -44,7 +61,7 @@ class Question:
     difficulty: DifficultyLevel
     question_type: str  # "recall", "application", "synthesis"
 
-@dataclass
+@dataclass(slots=True)
 class ReviewSession:
     id: str
     concept_id: str
@@ -56,17 +73,263 @@ class ReviewSession:
     feedback: Optional[str]
     session_type: str
 
+# Enum members indexed by value so row decoding is a tuple index instead of
+# the enum class __call__ lookup (MasteryLevel starts at 0, DifficultyLevel at 1)
+_MASTERY = tuple(MasteryLevel)
+_DIFFICULTY = tuple(DifficultyLevel)
+
+# Question difficulty tracks mastery; tuples indexed by the enum's int value
+# (UNKNOWN..MASTERED / BASIC..EXPERT), shared by the sync, async and batch
+# generators — a tuple index instead of an enum-keyed dict lookup per call
+_DIFFICULTY_BY_MASTERY = (DifficultyLevel.BASIC, DifficultyLevel.BASIC,
+                          DifficultyLevel.INTERMEDIATE, DifficultyLevel.ADVANCED,
+                          DifficultyLevel.EXPERT)
+
+_QTYPE_BY_DIFFICULTY = ("recall", "application", "application", "synthesis")
+
+# FSRS-4.5 scheduling (published weights): next_review comes from a per-
+# concept memory stability instead of the old fixed 5-bucket interval map
+_FSRS_TARGET_RETENTION = 0.9
+_FSRS_W6 = 0.86
+_FSRS_W8 = 1.54575
+_FSRS_W9 = 0.1192
+_FSRS_W10 = 1.01925
+_FSRS_W11 = 1.9395
+_FSRS_W12 = 0.11
+_FSRS_W13 = 0.29605
+_FSRS_W14 = 2.2698
+_FSRS_W17 = 0.5425
+_FSRS_W18 = 0.0912
+
+def _fsrs_retrievability(elapsed_days: float, stability: float) -> float:
+    """Probability of recall after elapsed_days (FSRS power forgetting curve)"""
+    return (1.0 + elapsed_days / (9.0 * stability)) ** -1.0
+
+def _fsrs_next_stability(stability: float, difficulty: float,
+                         retrievability: float, recalled: bool) -> float:
+    """Post-review stability for a successful recall or a lapse"""
+    if recalled:
+        stability = stability * (1.0 + math.exp(_FSRS_W8)
+                                 * (11.0 - difficulty)
+                                 * stability ** -_FSRS_W9
+                                 * (math.exp(_FSRS_W10 * (1.0 - retrievability)) - 1.0))
+    else:
+        stability = (_FSRS_W11 * difficulty ** -_FSRS_W12
+                     * ((stability + 1.0) ** _FSRS_W13 - 1.0)
+                     * math.exp(_FSRS_W14 * (1.0 - retrievability)))
+    return max(stability, 0.1)
+
+def _fsrs_short_term_stability(stability: float, recalled: bool) -> float:
+    """Same-day review update — the long-term formula is a no-op when no
+    time has passed, so sub-day repeats use the short-term rule instead"""
+    grade = 3 if recalled else 1
+    return max(stability * math.exp(_FSRS_W17 * (grade - 3 + _FSRS_W18)), 0.1)
+
+def _fsrs_next_difficulty(difficulty: float, recalled: bool) -> float:
+    """Drift difficulty toward harder on lapses, clamped to 1-10"""
+    grade = 3 if recalled else 1
+    return min(max(difficulty - _FSRS_W6 * (grade - 3), 1.0), 10.0)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _token_overlap(answer: str, reference: str) -> float:
+    """Fraction of the answer's tokens found in the reference text; set
+    intersection runs in C, so this grades locally in microseconds"""
+    answer_tokens = set(_TOKEN_RE.findall(answer.lower()))
+    if not answer_tokens:
+        return 0.0
+    reference_tokens = set(_TOKEN_RE.findall(reference.lower()))
+    return len(answer_tokens & reference_tokens) / len(answer_tokens)
+
+def _question_prompt(concept: Concept, difficulty: DifficultyLevel) -> str:
+    return f"""You are an educational AI that creates study questions. 
+                        Generate a {difficulty.value} question about the given concept.
+                        
+                        Difficulty levels:
+                        - RECALL: Simple factual questions (What is...? Define...)
+                        - APPLICATION: Apply knowledge (How would you use...? Calculate...)
+                        - SYNTHESIS: Complex analysis (Compare and contrast... Analyze the implications...)
+                        
+                        Return only the question text, nothing else.
+                        
+                        Create a {difficulty.value} question about: {concept.name}
+                        
+                        Concept details: {concept.content}"""
+
+# Hot SQL as module constants: the same string object every call, so sqlite3's
+# per-connection statement cache can reuse the prepared statement
+SQL_GET_CONCEPTS = """
+    SELECT id, class_id, name, content, mastery_level, last_reviewed, 
+           next_review, review_count, correct_streak, difficulty_level, created_at,
+           last_reviewed_ts, next_review_ts, stability, difficulty
+    FROM concepts 
+    WHERE class_id = ?
+    ORDER BY next_review_ts ASC
+"""
+
+SQL_GET_CONCEPT = """
+    SELECT id, class_id, name, content, mastery_level, last_reviewed,
+           next_review, review_count, correct_streak, difficulty_level, created_at,
+           last_reviewed_ts, next_review_ts, stability, difficulty
+    FROM concepts
+    WHERE id = ?
+"""
+
+# Written as a UNION of two indexable branches instead of an OR, so each
+# branch walks its own index rather than scanning the class's concepts
+SQL_DUE_CONCEPTS = """
+    SELECT id, class_id, name, content, mastery_level, last_reviewed, 
+           next_review, review_count, correct_streak, difficulty_level, created_at,
+           last_reviewed_ts, next_review_ts, stability, difficulty
+    FROM concepts 
+    WHERE class_id = ? AND next_review_ts <= ?
+    UNION
+    SELECT id, class_id, name, content, mastery_level, last_reviewed, 
+           next_review, review_count, correct_streak, difficulty_level, created_at,
+           last_reviewed_ts, next_review_ts, stability, difficulty
+    FROM concepts 
+    WHERE class_id = ? AND mastery_level = 0 AND correct_streak < 3
+    ORDER BY mastery_level ASC, correct_streak ASC, next_review_ts ASC
+"""
+
+SQL_UPDATE_CONCEPT = """
+    UPDATE concepts 
+    SET mastery_level = ?, last_reviewed = ?, next_review = ?, 
+        review_count = ?, correct_streak = ?,
+        last_reviewed_ts = ?, next_review_ts = ?,
+        stability = ?, difficulty = ?
+    WHERE id = ?
+"""
+
+SQL_CLASS_STATS = """
+    SELECT mastery_level, count FROM class_stats WHERE class_id = ? AND count > 0
+"""
+
+SQL_CLASS_DUE_COUNT = """
+    SELECT COUNT(*) FROM (
+        SELECT id FROM concepts WHERE class_id = ? AND next_review_ts <= ?
+        UNION
+        SELECT id FROM concepts WHERE class_id = ? AND mastery_level = 0 AND correct_streak < 3
+    )
+"""
+
+SQL_BUMP_CLASS_STATS = """
+    INSERT INTO class_stats (class_id, mastery_level, count)
+    VALUES (?, ?, ?)
+    ON CONFLICT(class_id, mastery_level) DO UPDATE SET count = count + excluded.count
+"""
+
+# Question pool: generated questions persist per (concept, mastery tier) and
+# get rotated through, so warm concepts stop paying the generation API call
+SQL_POOL_GET = """
+    SELECT question_text, expected_answer FROM questions
+    WHERE concept_id = ? AND mastery_level = ?
+"""
+
+SQL_POOL_ADD = """
+    INSERT INTO questions (id, concept_id, mastery_level, question_text, expected_answer, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+SQL_INSERT_SESSION = """
+    INSERT INTO review_sessions (id, concept_id, question, user_answer, correct, 
+                               timestamp, hints_used, feedback)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+class ResponseCache:
+    """SQLite-backed cache for AI responses keyed on a normalized request
+    hash, so repeated questions and re-submitted answers skip the API call"""
+
+    TTL_DAYS = 7
+
+    def __init__(self):
+        conn = get_db()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                hash TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        # Evict stale entries once at startup instead of per lookup
+        cutoff = (datetime.now() - timedelta(days=self.TTL_DAYS)).isoformat()
+        conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (cutoff,))
+        conn.commit()
+
+    @staticmethod
+    def _key(*parts) -> str:
+        # blake2b is the fastest keyed hash in hashlib; 16 bytes is plenty
+        # for a cache key and keeps the indexed column short
+        return hashlib.blake2b("\x1f".join(str(p) for p in parts).encode(),
+                               digest_size=16).hexdigest()
+
+    def get(self, *parts) -> Optional[str]:
+        row = get_db().execute(
+            "SELECT response FROM answer_cache WHERE hash = ?",
+            (self._key(*parts),)
+        ).fetchone()
+        return row['response'] if row else None
+
+    def put(self, response: str, *parts):
+        conn = get_db()
+        conn.execute(
+            "INSERT OR REPLACE INTO answer_cache (hash, response, created_at) VALUES (?, ?, ?)",
+            (self._key(*parts), response, datetime.now().isoformat())
+        )
+        conn.commit()
+
+
+def _when(ts, iso):
+    """Decode a timestamp from the epoch column when present; fromtimestamp
+    is much cheaper than fromisoformat, which only covers legacy rows"""
+    if ts is not None:
+        return datetime.fromtimestamp(ts)
+    return datetime.fromisoformat(iso) if iso else None
+
+def _row_to_concept(row) -> Concept:
+    """Build a Concept from a row, shared by every concept fetch"""
+    return Concept(
+        id=row['id'],
+        class_id=row['class_id'],
+        name=row['name'],
+        content=row['content'],
+        mastery_level=_MASTERY[row['mastery_level']],
+        last_reviewed=_when(row['last_reviewed_ts'], row['last_reviewed']),
+        next_review=_when(row['next_review_ts'], row['next_review']),
+        review_count=row['review_count'],
+        correct_streak=row['correct_streak'],
+        difficulty_level=_DIFFICULTY[row['difficulty_level'] - 1],
+        created_at=datetime.fromisoformat(row['created_at']),
+        stability=row['stability'] if row['stability'] is not None else 2.0,
+        difficulty=row['difficulty'] if row['difficulty'] is not None else 5.0
+    )
+
+# One shared client for the whole process: the keep-alive pool reuses warm
+# TCP+TLS connections across question, evaluation and concept calls instead
+# of paying the handshake per request
+_client = anthropic.Anthropic(
+    api_key=os.getenv('ANTHROPIC_API_KEY'),
+    http_client=httpx.Client(
+        timeout=30,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=40)
+    )
+)
+
 class ActiveRecallSystem:
     def __init__(self):
-        self.anthropic_client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+        self.anthropic_client = _client
+        self.cache = ResponseCache()
     
     def generate_concepts_from_notes(self, class_id: str) -> List[str]:
         """Generate concepts from all notes in a class, avoiding duplicates"""
         conn = get_db()
         
-        # Get all notes for this class
+        # Newest notes first: the prompt budget is ~8000 chars, so recent
+        # material should fill it rather than whatever sorts first
         notes = conn.execute("""
             SELECT cleaned_text FROM notes WHERE class_id = ?
+            ORDER BY created_at DESC
         """, (class_id,)).fetchall()
         
         if not notes:
@@ -78,57 +341,70 @@ class ActiveRecallSystem:
         """, (class_id,)).fetchall()
         existing_names = {concept['name'].lower() for concept in existing_concepts}
         
-        # Combine all note content
-        combined_content = "\n\n".join([note['cleaned_text'] for note in notes])
+        # Accumulate only up to the prompt budget, skipping re-uploads of
+        # identical text, instead of concatenating every note and slicing
+        parts = []
+        seen_hashes = set()
+        accumulated = 0
+        for note in notes:
+            text = note['cleaned_text'] or ""
+            text_hash = hashlib.blake2b(text.encode(), digest_size=16).digest()
+            if not text or text_hash in seen_hashes:
+                continue
+            seen_hashes.add(text_hash)
+            parts.append(text)
+            accumulated += len(text) + 2
+            if accumulated >= 8000:
+                break
+        combined_content = "\n\n".join(parts)
         
         # Generate concepts using AI
         concepts_data = self._generate_concepts_with_ai(combined_content)
         
+        # Build all rows first, then insert them with one executemany inside
+        # a single transaction instead of one statement round-trip per concept
+        now = datetime.now()
+        now_iso = now.isoformat()
+        now_ts = int(now.timestamp())
         concept_ids = []
+        rows = []
         for concept_data in concepts_data:
             # Skip if concept already exists
             if concept_data['name'].lower() in existing_names:
                 continue
-                
+
             concept_id = str(uuid.uuid4())
-            now = datetime.now()
-            
-            concept = Concept(
-                id=concept_id,
-                class_id=class_id,
-                name=concept_data['name'],
-                content=concept_data['content'],
-                mastery_level=MasteryLevel.UNKNOWN,
-                last_reviewed=None,
-                next_review=now,
-                review_count=0,
-                correct_streak=0,
-                difficulty_level=DifficultyLevel(concept_data.get('difficulty', 1)),
-                created_at=now
-            )
-            
-            # Save to database
-            conn.execute("""
-                INSERT INTO concepts (id, class_id, name, content, mastery_level, 
-                                    last_reviewed, next_review, review_count, correct_streak, 
-                                    difficulty_level, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                concept.id, concept.class_id, concept.name, concept.content,
-                concept.mastery_level.value, None, concept.next_review.isoformat(),
-                concept.review_count, concept.correct_streak, concept.difficulty_level.value,
-                concept.created_at.isoformat()
-            ))
-            
             concept_ids.append(concept_id)
-        
-        conn.commit()
+            rows.append((
+                concept_id, class_id, concept_data['name'], concept_data['content'],
+                MasteryLevel.UNKNOWN.value, None, now_iso,
+                0, 0, DifficultyLevel(concept_data.get('difficulty', 1)).value,
+                now_iso, None, now_ts, 0.5, 5.0
+            ))
+
+        if rows:
+            with conn:
+                conn.executemany("""
+                    INSERT INTO concepts (id, class_id, name, content, mastery_level, 
+                                        last_reviewed, next_review, review_count, correct_streak, 
+                                        difficulty_level, created_at, last_reviewed_ts, next_review_ts,
+                                        stability, difficulty)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                conn.execute(SQL_BUMP_CLASS_STATS,
+                             (class_id, MasteryLevel.UNKNOWN.value, len(rows)))
         return concept_ids
     
     def _generate_concepts_with_ai(self, content: str) -> List[dict]:
-        """Generate concepts using AI from content"""
+        """Generate concepts using AI from content, streaming the response
+        and parsing each concept object as soon as it completes instead of
+        buffering the whole 2000-token reply before the first json.loads"""
+        decoder = json.JSONDecoder()
+        concepts_data = []
+        buffer = ""
+        in_array = False
         try:
-            response = self.anthropic_client.messages.create(
+            with self.anthropic_client.messages.stream(
                 model="claude-3-haiku-20240307",
                 max_tokens=2000,
                 messages=[
@@ -149,140 +425,109 @@ class ActiveRecallSystem:
                         {content[:8000]}"""
                     }
                 ]
-            )
-            
-            response_text = response.content[0].text.strip()
-            
-            # Handle cases where AI might return text before/after JSON
-            if response_text.startswith('[') and response_text.endswith(']'):
-                concepts_data = json.loads(response_text)
-            else:
-                # Try to extract JSON from response
-                start_idx = response_text.find('[')
-                end_idx = response_text.rfind(']') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = response_text[start_idx:end_idx]
-                    concepts_data = json.loads(json_str)
-                else:
-                    raise ValueError("No valid JSON array found in response")
-            
+            ) as stream:
+                for chunk in stream.text_stream:
+                    buffer += chunk
+                    if not in_array:
+                        # Skip any prose the model emits before the array
+                        start_idx = buffer.find('[')
+                        if start_idx == -1:
+                            continue
+                        buffer = buffer[start_idx + 1:]
+                        in_array = True
+                    # Pull out every complete {...} object accumulated so far
+                    while True:
+                        obj_start = buffer.find('{')
+                        if obj_start == -1:
+                            break
+                        try:
+                            concept_data, end = decoder.raw_decode(buffer, obj_start)
+                        except ValueError:
+                            break  # object still incomplete, wait for more
+                        concepts_data.append(concept_data)
+                        buffer = buffer[end:]
             return concepts_data
             
         except Exception as e:
             print(f"Error generating concepts with AI: {e}")
-            return []
+            # Keep whatever complete concepts arrived before the failure
+            return concepts_data
     
     def get_concepts_for_class(self, class_id: str) -> List[Concept]:
         """Get all concepts for a class"""
         conn = get_db()
-        rows = conn.execute("""
-            SELECT id, class_id, name, content, mastery_level, last_reviewed, 
-                   next_review, review_count, correct_streak, difficulty_level, created_at
-            FROM concepts 
-            WHERE class_id = ?
-            ORDER BY next_review ASC
-        """, (class_id,)).fetchall()
-        
-        concepts = []
-        for row in rows:
-            concepts.append(Concept(
-                id=row['id'],
-                class_id=row['class_id'],
-                name=row['name'],
-                content=row['content'],
-                mastery_level=MasteryLevel(row['mastery_level']),
-                last_reviewed=datetime.fromisoformat(row['last_reviewed']) if row['last_reviewed'] else None,
-                next_review=datetime.fromisoformat(row['next_review']),
-                review_count=row['review_count'],
-                correct_streak=row['correct_streak'],
-                difficulty_level=DifficultyLevel(row['difficulty_level']),
-                created_at=datetime.fromisoformat(row['created_at'])
-            ))
-        
-        return concepts
+        rows = conn.execute(SQL_GET_CONCEPTS, (class_id,)).fetchall()
+        return [_row_to_concept(row) for row in rows]
+
+    def get_concept(self, concept_id: str) -> Optional[Concept]:
+        """Get a single concept by id"""
+        row = get_db().execute(SQL_GET_CONCEPT, (concept_id,)).fetchone()
+        return _row_to_concept(row) if row else None
     
     def get_concepts_due_for_review(self, class_id: str) -> List[Concept]:
         """Get concepts that are due for review, prioritizing those with low mastery"""
         conn = get_db()
-        now = datetime.now().isoformat()
         
         # Get concepts due for review, prioritizing by mastery level (lowest first)
         # and include concepts that need more practice (correct_streak < 3 and mastery = 0)
-        rows = conn.execute("""
-            SELECT * FROM concepts 
-            WHERE class_id = ? AND (
-                next_review <= ? OR 
-                (mastery_level = 0 AND correct_streak < 3)
-            )
-            ORDER BY mastery_level ASC, correct_streak ASC, next_review ASC
-        """, (class_id, now)).fetchall()
-        
-        concepts = []
-        for row in rows:
-            concept = Concept(
-                id=row['id'],
-                class_id=row['class_id'],
-                name=row['name'],
-                content=row['content'],
-                mastery_level=MasteryLevel(row['mastery_level']),
-                last_reviewed=datetime.fromisoformat(row['last_reviewed']) if row['last_reviewed'] else None,
-                next_review=datetime.fromisoformat(row['next_review']),
-                review_count=row['review_count'],
-                correct_streak=row['correct_streak'],
-                difficulty_level=DifficultyLevel(row['difficulty_level']),
-                created_at=datetime.fromisoformat(row['created_at'])
-            )
-            concepts.append(concept)
-        
-        return concepts
+        now_ts = int(time.time())
+        rows = conn.execute(SQL_DUE_CONCEPTS, (class_id, now_ts, class_id)).fetchall()
+        return [_row_to_concept(row) for row in rows]
     
+    def _pooled_question(self, concept: Concept, difficulty: DifficultyLevel,
+                         question_type: str) -> Optional[Question]:
+        """Pick a random pooled question for this mastery tier once the pool
+        has a few entries; below that, callers keep generating to grow it"""
+        pool = get_db().execute(
+            SQL_POOL_GET, (concept.id, concept.mastery_level.value)).fetchall()
+        if len(pool) < 3:
+            return None
+        row = random.choice(pool)
+        return Question(
+            concept_id=concept.id,
+            question_text=row['question_text'],
+            expected_answer=row['expected_answer'],
+            difficulty=difficulty,
+            question_type=question_type
+        )
+
+    @staticmethod
+    def _pool_store(concept: Concept, question_text: str):
+        conn = get_db()
+        conn.execute(SQL_POOL_ADD, (str(uuid.uuid4()), concept.id,
+                                    concept.mastery_level.value, question_text, "",
+                                    datetime.now().isoformat()))
+        conn.commit()
+
+    @staticmethod
+    def _fallback_question(concept: Concept, difficulty: DifficultyLevel) -> Question:
+        return Question(
+            concept_id=concept.id,
+            question_text=f"Explain the key points about {concept.name}.",
+            expected_answer="Key concepts and principles",
+            difficulty=difficulty,
+            question_type="recall"
+        )
+
     def generate_question(self, concept: Concept) -> Question:
         """Generate a question for a concept based on mastery level"""
-        difficulty_map = {
-            MasteryLevel.UNKNOWN: DifficultyLevel.BASIC,
-            MasteryLevel.LEARNING: DifficultyLevel.BASIC,
-            MasteryLevel.FAMILIAR: DifficultyLevel.INTERMEDIATE,
-            MasteryLevel.PROFICIENT: DifficultyLevel.ADVANCED,
-            MasteryLevel.MASTERED: DifficultyLevel.EXPERT
-        }
-        
-        difficulty = difficulty_map[concept.mastery_level]
-        
-        question_types = {
-            DifficultyLevel.BASIC: "recall",
-            DifficultyLevel.INTERMEDIATE: "application", 
-            DifficultyLevel.ADVANCED: "application",
-            DifficultyLevel.EXPERT: "synthesis"
-        }
-        
-        question_type = question_types[difficulty]
-        
+        difficulty = _DIFFICULTY_BY_MASTERY[concept.mastery_level.value]
+        question_type = _QTYPE_BY_DIFFICULTY[difficulty.value - 1]
+
+        pooled = self._pooled_question(concept, difficulty, question_type)
+        if pooled is not None:
+            return pooled
+
         try:
             response = self.anthropic_client.messages.create(
                 model="claude-3-haiku-20240307",
                 max_tokens=200,
                 temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"""You are an educational AI that creates study questions. 
-                        Generate a {difficulty.value} question about the given concept.
-                        
-                        Difficulty levels:
-                        - RECALL: Simple factual questions (What is...? Define...)
-                        - APPLICATION: Apply knowledge (How would you use...? Calculate...)
-                        - SYNTHESIS: Complex analysis (Compare and contrast... Analyze the implications...)
-                        
-                        Return only the question text, nothing else.
-                        
-                        Create a {difficulty.value} question about: {concept.name}
-                        
-                        Concept details: {concept.content}"""
-                    }
-                ]
+                messages=[{"role": "user", "content": _question_prompt(concept, difficulty)}]
             )
             
             question = response.content[0].text.strip()
+            self._pool_store(concept, question)
             
             return Question(
                 concept_id=concept.id,
@@ -294,17 +539,105 @@ class ActiveRecallSystem:
             
         except Exception as e:
             print(f"Error generating question: {e}")
-            # Fallback question
-            return Question(
-                concept_id=concept.id,
-                question_text=f"Explain the key points about {concept.name}.",
-                expected_answer="Key concepts and principles",
-                difficulty=difficulty,
-                question_type="recall"
+            return self._fallback_question(concept, difficulty)
+
+    def generate_questions_batch(self, concepts: List[Concept]) -> List[Question]:
+        """Generate one question per concept with a single API call instead
+        of a round trip each, for prefetching all due questions at session
+        start. Concepts with a warm pool are served from it, and batch
+        results are pooled so later per-concept calls skip the API too."""
+        if not concepts:
+            return []
+
+        # Serve warm pools locally; only the rest need the model
+        ready = {}
+        pending = []
+        for concept in concepts:
+            difficulty = _DIFFICULTY_BY_MASTERY[concept.mastery_level.value]
+            pooled = self._pooled_question(
+                concept, difficulty, _QTYPE_BY_DIFFICULTY[difficulty.value - 1])
+            if pooled is not None:
+                ready[concept.id] = pooled
+            else:
+                pending.append(concept)
+
+        if len(pending) == 1:
+            ready[pending[0].id] = self.generate_question(pending[0])
+            pending = []
+
+        by_id = {}
+        if pending:
+            concept_list = "\n\n".join(
+                f"concept_id: {c.id}\nName: {c.name}\nDifficulty: {_DIFFICULTY_BY_MASTERY[c.mastery_level.value].value}\nDetails: {c.content[:1500]}"
+                for c in pending
             )
-    
+
+            try:
+                response = self.anthropic_client.messages.create(
+                    model="claude-3-haiku-20240307",
+                    max_tokens=200 * len(pending),
+                    temperature=0.7,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": f"""You are an educational AI that creates study questions.
+                            Generate ONE question for EACH of the following concepts, matching its difficulty level.
+
+                            Difficulty levels:
+                            - 1 (RECALL): Simple factual questions (What is...? Define...)
+                            - 2/3 (APPLICATION): Apply knowledge (How would you use...? Calculate...)
+                            - 4 (SYNTHESIS): Complex analysis (Compare and contrast... Analyze the implications...)
+
+                            Return ONLY a JSON array in this exact format:
+                            [{{"concept_id": "...", "question": "..."}}]
+
+                            Concepts:
+                            {concept_list}"""
+                        }
+                    ]
+                )
+
+                response_text = response.content[0].text.strip()
+                start_idx = response_text.find('[')
+                end_idx = response_text.rfind(']') + 1
+                if start_idx == -1 or end_idx == 0:
+                    raise ValueError("No valid JSON array found in response")
+                by_id = {item['concept_id']: item['question']
+                         for item in _json_loads(response_text[start_idx:end_idx])}
+            except Exception as e:
+                print(f"Error generating question batch: {e}")
+                by_id = {}
+
+        questions = []
+        for concept in concepts:
+            if concept.id in ready:
+                questions.append(ready[concept.id])
+                continue
+            text = by_id.get(concept.id)
+            if text:
+                difficulty = _DIFFICULTY_BY_MASTERY[concept.mastery_level.value]
+                self._pool_store(concept, text)
+                questions.append(Question(
+                    concept_id=concept.id,
+                    question_text=text,
+                    expected_answer="",
+                    difficulty=difficulty,
+                    question_type=_QTYPE_BY_DIFFICULTY[difficulty.value - 1]
+                ))
+            else:
+                # Missing from the batch reply — fall back to a single call
+                questions.append(self.generate_question(concept))
+        return questions
+
     def evaluate_answer(self, question: Question, user_answer: str, concept: Concept) -> Dict:
         """Evaluate user's answer using AI"""
+        # Re-submitting the same answer (modulo case/whitespace) to the same
+        # question returns the cached evaluation without a round trip
+        normalized = " ".join(user_answer.lower().split())
+        cached = self.cache.get('eval', concept.id, question.question_text, normalized)
+        if cached is not None:
+            return _json_loads(cached)
+
         try:
             response = self.anthropic_client.messages.create(
                 model="claude-3-haiku-20240307",
@@ -340,22 +673,35 @@ class ActiveRecallSystem:
                 ]
             )
             
-            evaluation = json.loads(response.content[0].text)
+            evaluation = _json_loads(response.content[0].text)
+            self.cache.put(json.dumps(evaluation), 'eval', concept.id,
+                           question.question_text, normalized)
             return evaluation
             
         except Exception as e:
             print(f"Error evaluating answer: {e}")
-            # Fallback evaluation
+            # Offline fallback: grade by how much of the answer overlaps the
+            # expected answer and concept content instead of a length check
+            overlap = _token_overlap(
+                user_answer, f"{question.expected_answer} {concept.content}")
+            score = round(overlap * 100)
+            correct = overlap >= 0.5 and len(user_answer.split()) >= 5
+            if correct:
+                feedback = "Your answer covers the key terms from the material. (Graded locally — AI feedback was unavailable.)"
+            else:
+                feedback = "Your answer is missing key terms from the material — review the concept and try again. (Graded locally — AI feedback was unavailable.)"
             return {
-                "correct": len(user_answer.strip()) > 10,  # Simple length check
-                "score": 50,
-                "feedback": "Answer received. Please review the concept material for better understanding."
+                "correct": correct,
+                "score": score,
+                "feedback": feedback
             }
     
-    def update_concept_progress(self, concept: Concept, correct: bool) -> Concept:
-        """Update concept progress based on answer correctness"""
-        conn = get_db()
-        now = datetime.now()
+    @staticmethod
+    def _advance_progress(concept: Concept, correct: bool, now: datetime) -> int:
+        """Apply the in-memory mastery/FSRS update and return the previous
+        mastery level (for the class_stats counter move)"""
+        old_level = concept.mastery_level.value
+        previous_review = concept.last_reviewed
         
         # Update review count
         concept.review_count += 1
@@ -381,80 +727,115 @@ class ActiveRecallSystem:
             if concept.mastery_level.value > MasteryLevel.UNKNOWN.value:
                 concept.mastery_level = MasteryLevel(concept.mastery_level.value - 1)
         
-        # Calculate next review date based on mastery level
-        review_intervals = {
-            MasteryLevel.UNKNOWN: 1,
-            MasteryLevel.LEARNING: 2,
-            MasteryLevel.FAMILIAR: 4,
-            MasteryLevel.PROFICIENT: 7,
-            MasteryLevel.MASTERED: 14
-        }
-        
+        # Update the FSRS memory state: retrievability at review time feeds
+        # the stability update, and the interval targets 90% recall
+        elapsed_days = ((now - previous_review).total_seconds() / 86400.0
+                        if previous_review else 0.0)
+        if elapsed_days < 1.0:
+            concept.stability = _fsrs_short_term_stability(concept.stability, correct)
+        else:
+            retrievability = _fsrs_retrievability(elapsed_days, concept.stability)
+            concept.stability = _fsrs_next_stability(
+                concept.stability, concept.difficulty, retrievability, correct)
+        concept.difficulty = _fsrs_next_difficulty(concept.difficulty, correct)
+
         # For concepts that still need practice (mastery = 0 and streak < 3), 
         # set next review to now so they can be practiced immediately
         if concept.mastery_level == MasteryLevel.UNKNOWN and concept.correct_streak < 3:
             concept.next_review = now  # Available for immediate practice
         else:
-            days_to_add = review_intervals[concept.mastery_level]
-            if not correct:
-                days_to_add = 1  # Reset to 1 day if incorrect
+            days_to_add = max(
+                9.0 * concept.stability * (1.0 / _FSRS_TARGET_RETENTION - 1.0), 1.0)
             concept.next_review = now + timedelta(days=days_to_add)
         
-        # Update database
-        conn.execute("""
-            UPDATE concepts 
-            SET mastery_level = ?, last_reviewed = ?, next_review = ?, 
-                review_count = ?, correct_streak = ?
-            WHERE id = ?
-        """, (
+        return old_level
+
+    @staticmethod
+    def _write_progress(conn, concept: Concept, old_level: int):
+        """Persist the concept row and move the class_stats counter; runs
+        inside whatever transaction the caller opened"""
+        conn.execute(SQL_UPDATE_CONCEPT, (
             concept.mastery_level.value,
             concept.last_reviewed.isoformat(),
             concept.next_review.isoformat(),
             concept.review_count,
             concept.correct_streak,
+            int(concept.last_reviewed.timestamp()),
+            int(concept.next_review.timestamp()),
+            concept.stability,
+            concept.difficulty,
             concept.id
         ))
-        conn.commit()
-        
+        if concept.mastery_level.value != old_level:
+            conn.execute(SQL_BUMP_CLASS_STATS, (concept.class_id, old_level, -1))
+            conn.execute(SQL_BUMP_CLASS_STATS,
+                         (concept.class_id, concept.mastery_level.value, 1))
+
+    def update_concept_progress(self, concept: Concept, correct: bool) -> Concept:
+        """Update concept progress based on answer correctness"""
+        conn = get_db()
+        now = datetime.now()
+        old_level = self._advance_progress(concept, correct, now)
+        with conn:
+            self._write_progress(conn, concept, old_level)
         return concept
+
+    def record_review(self, concept: Concept, question: str, user_answer: str,
+                      correct: bool, feedback: str, hints_used: int = 0) -> Tuple[Concept, str]:
+        """Update the concept's progress and save the review session in one
+        transaction — one fsync per submitted answer instead of two"""
+        conn = get_db()
+        now = datetime.now()
+        old_level = self._advance_progress(concept, correct, now)
+        session_id = str(uuid.uuid4())
+        with conn:
+            self._write_progress(conn, concept, old_level)
+            conn.execute(SQL_INSERT_SESSION,
+                         (session_id, concept.id, question, user_answer, correct,
+                          now.isoformat(), hints_used, feedback))
+        return concept, session_id
     
     def save_review_session(self, concept_id: str, question: str, user_answer: str, 
                            correct: bool, feedback: str, hints_used: int = 0) -> str:
-        """Save a review session to the database"""
+        """Save a review session to the database (prefer record_review, which
+        also updates progress in the same transaction)"""
         conn = get_db()
         session_id = str(uuid.uuid4())
         now = datetime.now().isoformat()
         
-        conn.execute("""
-            INSERT INTO review_sessions (id, concept_id, question, user_answer, correct, 
-                                       timestamp, hints_used, feedback)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (session_id, concept_id, question, user_answer, correct, now, hints_used, feedback))
-        
-        conn.commit()
+        with conn:
+            conn.execute(SQL_INSERT_SESSION,
+                         (session_id, concept_id, question, user_answer, correct, now, hints_used, feedback))
         return session_id
     
     def get_class_progress(self, class_id: str) -> Dict:
         """Get overall progress statistics for a class"""
-        concepts = self.get_concepts_for_class(class_id)
-        
-        if not concepts:
+        # Distribution comes from the maintained class_stats counters (at
+        # most 5 rows); only the time-dependent due count touches concepts,
+        # via the same indexed UNION as the due fetch
+        conn = get_db()
+        counts_by_level = dict(conn.execute(SQL_CLASS_STATS, (class_id,)).fetchall())
+        total = sum(counts_by_level.values())
+
+        if not total:
             return {
                 "total_concepts": 0,
                 "mastery_distribution": {},
                 "concepts_due": 0,
                 "average_mastery": 0
             }
-        
-        mastery_counts = {}
-        for level in MasteryLevel:
-            mastery_counts[level.name] = sum(1 for c in concepts if c.mastery_level == level)
-        
-        concepts_due = len(self.get_concepts_due_for_review(class_id))
-        average_mastery = sum(c.mastery_level.value for c in concepts) / len(concepts)
-        
+
+        mastery_counts = {
+            level.name: counts_by_level.get(level.value, 0)
+            for level in MasteryLevel
+        }
+        now_ts = int(time.time())
+        concepts_due = conn.execute(SQL_CLASS_DUE_COUNT,
+                                    (class_id, now_ts, class_id)).fetchone()[0]
+        average_mastery = sum(level * count for level, count in counts_by_level.items()) / total
+
         return {
-            "total_concepts": len(concepts),
+            "total_concepts": total,
             "mastery_distribution": mastery_counts,
             "concepts_due": concepts_due,
             "average_mastery": round(average_mastery, 2)
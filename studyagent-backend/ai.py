@@ -1,27 +1,116 @@
+import asyncio
+import hashlib
+import json
 import os
+import re
+import time
 import anthropic
+import httpx
 from textwrap import wrap
 
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-MAX_CHARS = 8000  # safe chunk size for Claude Sonnet
+from db import get_db
 
-def chunk_text(text, max_chars=MAX_CHARS):
-    """
-    Split text into safe chunks by characters.
-    """
-    return wrap(text, max_chars)
+# Keep-alive pool so back-to-back chunk rewrites reuse the warm connection
+client = anthropic.Anthropic(
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    http_client=httpx.Client(
+        timeout=30,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=40)
+    )
+)
 
-def rewrite_notes(raw_text: str) -> str:
+aclient = anthropic.AsyncAnthropic(
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    http_client=httpx.AsyncClient(
+        timeout=30,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=40)
+    )
+)
+# Per-chunk input budget (~4 chars/token heuristic). Sized to the
+# completion cap, not the model's input window: a rewrite emits roughly
+# as many tokens as it reads, so each chunk must fit inside one 4500-token
+# completion with headroom for LaTeX/markdown expansion and the fused JSON
+# wrapper — bigger chunks come back silently truncated at max_tokens.
+MAX_TOKENS = 3000
+
+# Compiled once: bullet stripping per summary line
+_bullet_re = re.compile(r"^[\s\-•*]+")
+
+# Persistent content-hash cache: the same chunk text always produces an
+# equally good rewrite, so repeat uploads (same PDF twice, two classes
+# sharing a chapter) are served from sqlite instead of a Claude call.
+# Bump the version prefix to invalidate after prompt changes.
+_CACHE_VERSION = "v1"
+
+def _cache_key(kind: str, text: str) -> str:
+    return hashlib.sha256(f"{_CACHE_VERSION}|{kind}|{text}".encode()).hexdigest()
+
+def _cache_get(kind: str, text: str):
+    row = get_db().execute(
+        "SELECT response FROM ai_cache WHERE hash=?",
+        (_cache_key(kind, text),)
+    ).fetchone()
+    return row["response"] if row else None
+
+def _cache_put(kind: str, text: str, response: str):
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ai_cache (hash, kind, response) VALUES (?, ?, ?)",
+            (_cache_key(kind, text), kind, response)
+        )
+
+# Near-duplicate tier on top of the exact-hash cache: a rescan with a
+# one-character OCR diff still gets the stored rewrite. Guarded like the
+# orjson import so ai.py stays usable without the embedding stack.
+try:
+    from semantic_cache import SemanticCache
+    _chunk_sim_cache = SemanticCache(threshold=0.95, ttl_seconds=3600)
+except ImportError:
+    _chunk_sim_cache = None
+
+def _chunk_embedding(text: str):
+    # Lazy import: only load the sentence-transformer when a rewrite
+    # actually reaches this tier
+    from embeddings import model
+    return model.encode([text])[0]
+
+def chunk_text(text, max_tokens=MAX_TOKENS):
     """
-    Uses AI to rewrite raw lecture text into clean structured Markdown notes
+    Split text into chunks along paragraph boundaries, packing greedily
+    by an estimated token count (len//4). Unlike textwrap.wrap this never
+    rewraps whitespace or cuts mid-sentence — the model relies on the
+    paragraph structure — and token-based packing fills each request,
+    so typical notes fit in one or two chunks instead of ~10.
     """
-    prompt = f"""
-    Convert the following messy lecture notes into clean, well-structured Markdown format.
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in text.split("\n\n"):
+        paragraph_tokens = len(paragraph) // 4 + 1
+        if current and current_tokens + paragraph_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        if paragraph_tokens > max_tokens:
+            # Pathological single paragraph: fall back to a character split
+            chunks.extend(wrap(paragraph, max_tokens * 4))
+            continue
+        current.append(paragraph)
+        current_tokens += paragraph_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks or [text]
+
+# Static instruction preambles sent as cache-controlled system blocks.
+# They are byte-identical across every chunk of every upload, so after the
+# first request Anthropic serves the ~1KB of rules and examples from the
+# prompt cache instead of reprocessing them; only the raw chunk text
+# travels in the (uncached) user message.
+_REWRITE_INSTRUCTIONS = """
+    Convert the messy lecture notes in the user message into clean, well-structured Markdown format.
 
     Requirements:
     - Use proper Markdown headers (# for main topics, ## for subtopics)
     - Format ALL mathematical expressions using proper LaTeX syntax enclosed in $ for inline math or $$ for display math
-    - Convert mathematical symbols to proper LaTeX: ℝ² → $\\mathbb{{R}}^2$, √ → $\\sqrt{{}}$, vectors → $\\vec{{v}}$, etc.
+    - Convert mathematical symbols to proper LaTeX: ℝ² → $\\mathbb{R}^2$, √ → $\\sqrt{}$, vectors → $\\vec{v}$, etc.
     - Use bullet points (-) for lists
     - Use **bold** for emphasis
     - Organize content logically with clear sections
@@ -31,29 +120,75 @@ def rewrite_notes(raw_text: str) -> str:
     - Use proper LaTeX for Greek letters: θ → $\\theta$, λ → $\\lambda$, etc.
 
     Examples of proper math formatting:
-    - Coordinate systems: $\\mathbb{{R}}^2$, $\\mathbb{{R}}^3$
-    - Vectors: $\\vec{{v}}$, $\\vec{{u}}$
-    - Vector length: $||\\vec{{v}}|| = \\sqrt{{a^2 + b^2}}$
-    - Unit vectors: $\\hat{{i}} = (1,0)$, $\\hat{{j}} = (0,1)$
+    - Coordinate systems: $\\mathbb{R}^2$, $\\mathbb{R}^3$
+    - Vectors: $\\vec{v}$, $\\vec{u}$
+    - Vector length: $||\\vec{v}|| = \\sqrt{a^2 + b^2}$
+    - Unit vectors: $\\hat{i} = (1,0)$, $\\hat{j} = (0,1)$
     - Equations: $a^2 + b^2 = 1$
+"""
+
+_REWRITE_SYSTEM = [{
+    "type": "text",
+    "text": _REWRITE_INSTRUCTIONS
+            + "\n    Return ONLY the formatted Markdown content with proper LaTeX math, no explanations.\n",
+    "cache_control": {"type": "ephemeral"},
+}]
 
-    Raw notes to convert:
-    {raw_text}
+# Fused rewrite + summarize variant: the summary is a function of the
+# rewrite, so asking for both halves the API calls and avoids resending
+# the rewritten markdown as summarize input
+_FUSED_SYSTEM = [{
+    "type": "text",
+    "text": _REWRITE_INSTRUCTIONS + """
+    Additionally, summarize the rewritten notes into 5-10 concise bullet points.
 
-    Return ONLY the formatted Markdown content with proper LaTeX math, no explanations.
+    Instead of returning the Markdown directly, return ONLY a JSON object:
+    {"markdown": "<the formatted Markdown with proper LaTeX math>", "summary": ["bullet 1", "bullet 2", ...]}
+""",
+    "cache_control": {"type": "ephemeral"},
+}]
+
+_SUMMARIZE_SYSTEM = [{
+    "type": "text",
+    "text": "Summarize the notes in the user message into 5-10 concise bullet points.",
+    "cache_control": {"type": "ephemeral"},
+}]
+
+def rewrite_notes(raw_text: str) -> str:
     """
+    Uses AI to rewrite raw lecture text into clean structured Markdown notes
+    """
+    cached = _cache_get("rewrite", raw_text)
+    if cached is not None:
+        return cached
+
+    embedding = None
+    if _chunk_sim_cache is not None:
+        try:
+            embedding = _chunk_embedding(raw_text)
+            near_hit = _chunk_sim_cache.get(embedding)
+            if near_hit is not None:
+                return near_hit
+        except Exception as e:
+            print(f"[AI ERROR] semantic cache: {e}")
+
     try:
         response = client.messages.create(
             model="claude-sonnet-4-20250514",  # Use the correct model name
             max_tokens=4000,  # Increase token limit for better formatting
+            system=_REWRITE_SYSTEM,
             messages=[
                 {
                     "role": "user",
-                    "content": prompt
+                    "content": raw_text
                 }
             ],
         )
-        return response.content[0].text.strip()
+        rewritten = response.content[0].text.strip()
+        _cache_put("rewrite", raw_text, rewritten)
+        if embedding is not None:
+            _chunk_sim_cache.put(raw_text, embedding, rewritten)
+        return rewritten
     except Exception as e:
         print(f"[AI ERROR] {e}")
         return raw_text
@@ -61,16 +196,23 @@ def rewrite_notes(raw_text: str) -> str:
 
 def summarize_text(text: str) -> dict:
     """Send text to Claude and return cleaned + summarized version."""
-    cleaned = " ".join(text.split())
+    # Keep the original line/paragraph structure; collapsing whitespace
+    # destroyed formatting the reader (and the model) depends on
+    cleaned = text.strip()
+
+    cached = _cache_get("summary", text)
+    if cached is not None:
+        return {"cleaned": cleaned, "summary": json.loads(cached)}
 
     try:
         response = client.messages.create(
             model="claude-sonnet-4-20250514",  # Use the correct model name
             max_tokens=500,
+            system=_SUMMARIZE_SYSTEM,
             messages=[
                 {
                     "role": "user",
-                    "content": f"Summarize the following notes into 5-10 concise bullet points:\n\n{text}"
+                    "content": text
                 }
             ],
         )
@@ -79,10 +221,13 @@ def summarize_text(text: str) -> dict:
         if response.content and len(response.content) > 0:
             summary_text = response.content[0].text.strip()
 
-        summary_list = [line.strip("-• ") for line in summary_text.split("\n") if line.strip()]
+        summary_list = [_bullet_re.sub("", line).strip()
+                        for line in summary_text.splitlines() if line.strip()]
 
         if not summary_list:
             summary_list = ["Summary unavailable."]
+        else:
+            _cache_put("summary", text, json.dumps(summary_list))
 
         return {
             "cleaned": cleaned,
@@ -92,24 +237,126 @@ def summarize_text(text: str) -> dict:
     except Exception as e:
         print(f"[AI ERROR] {e}")
         return {"cleaned": cleaned, "summary": ["Summary unavailable."]}
+def _parse_fused(text: str, chunk: str) -> tuple:
+    """Parse a fused rewrite+summary JSON response, tolerating prose around
+    the object; falls back to the raw chunk on malformed output."""
+    start, end = text.find("{"), text.rfind("}") + 1
+    data = json.loads(text[start:end]) if start != -1 and end else {}
+    rewritten = data.get("markdown") or chunk
+    summary = [str(b).strip() for b in data.get("summary", []) if str(b).strip()]
+    return rewritten, summary
+
+async def _process_chunk_async(chunk: str, semaphore: asyncio.Semaphore) -> tuple:
+    """Rewrite and summarize one chunk with a single fused call, under the
+    shared concurrency cap. Returns (rewritten_markdown, summary_lines)."""
+    cached = _cache_get("fused", chunk)
+    if cached is not None:
+        rewritten, summary = json.loads(cached)
+        return rewritten, summary or ["Summary unavailable."]
+
+    async with semaphore:
+        try:
+            response = await aclient.messages.create(
+                model="claude-sonnet-4-20250514",
+                max_tokens=4500,
+                system=_FUSED_SYSTEM,
+                messages=[{"role": "user", "content": chunk}],
+            )
+            rewritten, summary = _parse_fused(response.content[0].text.strip(), chunk)
+            _cache_put("fused", chunk, json.dumps([rewritten, summary]))
+        except Exception as e:
+            print(f"[AI ERROR] {e}")
+            rewritten, summary = chunk, []
+
+    return rewritten, summary or ["Summary unavailable."]
+
+async def _process_long_text_async(text: str) -> dict:
+    """Fan the per-chunk rewrite+summarize pipelines out concurrently;
+    8 requests in flight at most for rate-limit headroom"""
+    chunks = chunk_text(text)
+    print(f"[AI] Processing {len(chunks)} chunks concurrently")
+    semaphore = asyncio.Semaphore(8)
+    results = await asyncio.gather(
+        *(_process_chunk_async(chunk, semaphore) for chunk in chunks))
+
+    summary_chunks = []
+    for _, summary in results:
+        summary_chunks.extend(summary)
+
+    merged_rewritten = "\n\n---\n\n".join(rewritten for rewritten, _ in results)
+
+    return {
+        "cleaned": merged_rewritten,
+        "summary": summary_chunks
+    }
+
 def process_long_text(text: str) -> dict:
     """
     Handles long lecture notes by splitting into chunks.
-    Each chunk gets rewritten + summarized, then merged.
+    Each chunk gets rewritten + summarized, then merged — chunks are
+    processed concurrently, so wall time is ~one chunk's latency, not the sum.
+    """
+    return asyncio.run(_process_long_text_async(text))
+
+# Uploads with more chunks than this go through the Batches API: half the
+# cost per token, and well past the point where the user expects to wait
+# on the request anyway
+BATCH_THRESHOLD = 20
+_BATCH_POLL_SECONDS = 5
+
+def process_long_text_batch(text: str) -> dict:
+    """
+    Same rewrite+summarize pipeline as process_long_text, but submitted
+    through the Message Batches API (billed at 50% of standard rates).
+    Blocks polling until the batch ends, so only use it for big uploads
+    where the frontend already shows a processing state.
     """
     chunks = chunk_text(text)
-    rewritten_chunks = []
-    summary_chunks = []
+    print(f"[AI] Submitting {len(chunks)} chunks as a message batch")
+    batch = client.messages.batches.create(
+        requests=[
+            {
+                "custom_id": f"chunk-{i}",
+                "params": {
+                    "model": "claude-sonnet-4-20250514",
+                    "max_tokens": 4500,
+                    "system": _FUSED_SYSTEM,
+                    "messages": [{"role": "user", "content": chunk}],
+                },
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+    )
 
-    for i, chunk in enumerate(chunks, 1):
-        print(f"[AI] Processing chunk {i}/{len(chunks)} ({len(chunk)} chars)")
-        rewritten = rewrite_notes(chunk)
-        rewritten_chunks.append(rewritten)
+    while batch.processing_status != "ended":
+        time.sleep(_BATCH_POLL_SECONDS)
+        batch = client.messages.batches.retrieve(batch.id)
 
-        summary = summarize_text(rewritten)["summary"]
-        summary_chunks.extend(summary)
+    # Results stream in arbitrary order; reassemble by custom_id index,
+    # falling back to the raw chunk for any errored/expired entry
+    rewritten_by_index = {}
+    summary_by_index = {}
+    for entry in client.messages.batches.results(batch.id):
+        index = int(entry.custom_id.split("-", 1)[1])
+        if entry.result.type == "succeeded":
+            try:
+                rewritten, summary = _parse_fused(
+                    entry.result.message.content[0].text.strip(), chunks[index])
+            except Exception as e:
+                print(f"[AI ERROR] {e}")
+                rewritten, summary = chunks[index], []
+        else:
+            print(f"[AI ERROR] batch entry {entry.custom_id}: {entry.result.type}")
+            rewritten, summary = chunks[index], []
+        rewritten_by_index[index] = rewritten
+        summary_by_index[index] = summary or ["Summary unavailable."]
+
+    summary_chunks = []
+    for i in range(len(chunks)):
+        summary_chunks.extend(summary_by_index.get(i, ["Summary unavailable."]))
 
-    merged_rewritten = "\n\n---\n\n".join(rewritten_chunks)
+    merged_rewritten = "\n\n---\n\n".join(
+        rewritten_by_index.get(i, chunks[i]) for i in range(len(chunks)))
 
     return {
         "cleaned": merged_rewritten,
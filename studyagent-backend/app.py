@@ -6,7 +6,11 @@ import uuid
 from datetime import datetime
 from pathlib import Path
 import hashlib
-from flask import Flask, request, jsonify
+import mmap
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
@@ -16,7 +20,7 @@ load_dotenv(dotenv_path='../.env')
 
 # DB + AI helpers
 from db import get_db, init_db
-from ai import process_long_text
+from ai import process_long_text, process_long_text_batch, chunk_text, BATCH_THRESHOLD
 from extractors import extract_text_from_image, extract_text_from_pdf
 
 #embedding
@@ -38,6 +42,13 @@ from flask import send_from_directory
 # Initialize Active Recall System
 active_recall = ActiveRecallSystem()
 
+@app.teardown_appcontext
+def close_db(exception):
+    """Close the per-request connection get_db cached on g"""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.close()
+
 @app.route('/uploads/<path:filename>')
 def serve_uploads(filename):
     return send_from_directory('uploads', filename)
@@ -155,9 +166,112 @@ def get_topics():
 
 
 # -------- NOTES --------
-def calculate_file_hash(file_content):
-    """Calculate SHA-256 hash of file content"""
-    return hashlib.sha256(file_content).hexdigest()
+# OCR + Claude for a big upload can run for tens of seconds; doing that on
+# the request thread starves every other request. Uploads return 202 with a
+# pending note row and the pipeline runs here instead; the frontend polls
+# /api/notes/<id>/status.
+upload_executor = ThreadPoolExecutor(max_workers=2)
+
+# Concept generation re-scans the whole class, so running it per upload is
+# wasted work when several files arrive together. The first finished upload
+# arms a timer per class; uploads landing inside the window ride on it and
+# the class gets one generation pass.
+_CONCEPT_GEN_DELAY_SECONDS = 30
+_concept_gen_lock = threading.Lock()
+_concept_gen_pending = set()
+
+def schedule_concept_generation(class_id):
+    """Debounced auto-generation of Active Recall concepts for a class"""
+    with _concept_gen_lock:
+        if class_id in _concept_gen_pending:
+            return
+        _concept_gen_pending.add(class_id)
+
+    def run():
+        with _concept_gen_lock:
+            _concept_gen_pending.discard(class_id)
+        try:
+            concept_ids = active_recall.generate_concepts_from_notes(class_id)
+            print(f"Auto-generated {len(concept_ids)} concepts for Active Recall in class {class_id}")
+        except Exception as e:
+            print(f"Failed to auto-generate concepts: {e}")
+
+    timer = threading.Timer(_CONCEPT_GEN_DELAY_SECONDS, run)
+    timer.daemon = True
+    timer.start()
+
+def process_upload(note_id, filepath, filename, class_id, topic_name, class_name, use_batch):
+    """Background half of upload_note: extraction, AI pipeline, embeddings"""
+    conn = get_db()
+    try:
+        # --- Extract text
+        filepath = Path(filepath)
+        if filename.endswith(".txt"):
+            # Decode straight off the page cache via mmap: read_text holds
+            # the raw bytes and the decoded str in memory at once, doubling
+            # the peak for large text notes
+            if filepath.stat().st_size == 0:
+                raw_text = ""
+            else:
+                with open(filepath, "rb") as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    raw_text = mm[:].decode("utf-8", errors="ignore")
+        elif filename.endswith(".pdf"):
+            raw_text = extract_text_from_pdf(str(filepath))
+        else:
+            raw_text = extract_text_from_image(str(filepath))
+
+        if not raw_text.strip():
+            conn.execute("UPDATE notes SET status='error' WHERE id=?", (note_id,))
+            conn.commit()
+            return
+
+        # Second dedup layer, on the *extracted* text: a re-scanned PDF or a
+        # different export of the same slides has a new file_hash but identical
+        # text, so reuse the stored AI output instead of re-running the pipeline
+        text_hash = hashlib.sha256(raw_text.encode()).hexdigest()
+        existing_by_text = conn.execute(
+            "SELECT cleaned_text, summary FROM notes WHERE text_hash=? AND id != ?",
+            (text_hash, note_id)
+        ).fetchone()
+
+        if existing_by_text:
+            formatted_notes = existing_by_text["cleaned_text"]
+            summary_json = existing_by_text["summary"] or "[]"
+        else:
+            # --- AI processing (with chunking). Very large uploads (or an
+            # explicit ?mode=batch) go through the Batches API at half the
+            # per-token cost.
+            if use_batch or len(chunk_text(raw_text)) > BATCH_THRESHOLD:
+                result = process_long_text_batch(raw_text)
+            else:
+                result = process_long_text(raw_text)
+            formatted_notes = result["cleaned"]
+            summary_json = json.dumps(result["summary"])
+
+        # --- Save AI notes (processed markdown)
+        class_ai_dir = Path(UPLOAD_AI) / topic_name / class_name
+        class_ai_dir.mkdir(parents=True, exist_ok=True)
+        notes_path = class_ai_dir / f"{Path(filename).stem}_ai.md"
+        notes_path.write_text(formatted_notes, encoding="utf-8")
+
+        # --- Store embeddings: split once into encoder-sized chunks and embed
+        # them in a single batched call
+        store_embedding(note_id, chunk_text(formatted_notes, max_tokens=200))
+
+        conn.execute("""
+            UPDATE notes SET cleaned_text=?, summary=?, notes_path=?, text_hash=?, status='ready'
+            WHERE id=?
+        """, (formatted_notes, summary_json, str(notes_path), text_hash, note_id))
+        conn.commit()
+    except Exception as e:
+        print(f"Upload processing failed for {note_id}: {e}")
+        conn.execute("UPDATE notes SET status='error' WHERE id=?", (note_id,))
+        conn.commit()
+        return
+
+    # Automatically generate concepts for Active Recall, coalesced per class
+    schedule_concept_generation(class_id)
 
 @app.route("/api/notes/<class_id>", methods=["POST"])
 def upload_note(class_id):
@@ -175,99 +289,89 @@ def upload_note(class_id):
     class_name = class_info["class_name"].replace(" ", "_")  # safe folder name
     topic_name = class_info["topic_name"].replace(" ", "_")
     file = request.files["file"]
-    
-    # Read file content for duplicate checking
-    file_content = file.read()
-    file.seek(0)  # Reset file pointer for later use
-    
+
     filename = secure_filename(file.filename.lower())
-    file_hash = calculate_file_hash(file_content)
-    
+
     # Check for duplicates by filename in this class
     existing_by_name = conn.execute(
-        "SELECT id, title FROM notes WHERE class_id=? AND title=?", 
+        "SELECT id, title FROM notes WHERE class_id=? AND title=?",
         (class_id, file.filename)
     ).fetchone()
-    
+
     if existing_by_name:
         return jsonify({
-            "error": "Duplicate file", 
+            "error": "Duplicate file",
             "message": f"A file named '{file.filename}' already exists in this class"
         }), 409
-    
+
+    # ensure raw dir exists
+    class_raw_dir = Path(UPLOAD_RAWS) / topic_name / class_name
+    class_raw_dir.mkdir(parents=True, exist_ok=True)
+
+    # Stream to disk while hashing: one read, one write, ~1MB resident,
+    # instead of buffering the whole file in RAM and saving it again
+    filepath = class_raw_dir / filename
+    hasher = hashlib.sha256()
+    with open(filepath, "wb") as out:
+        while buf := file.stream.read(1 << 20):
+            hasher.update(buf)
+            out.write(buf)
+    file_hash = hasher.hexdigest()
+
     # Check for duplicates by content hash across all classes
     existing_by_hash = conn.execute(
-        "SELECT n.id, n.title, c.name as class_name, t.name as topic_name FROM notes n JOIN classes c ON n.class_id = c.id JOIN topics t ON c.topic_id = t.id WHERE n.file_hash=?", 
+        "SELECT n.id, n.title, c.name as class_name, t.name as topic_name FROM notes n JOIN classes c ON n.class_id = c.id JOIN topics t ON c.topic_id = t.id WHERE n.file_hash=?",
         (file_hash,)
     ).fetchone()
-    
+
     if existing_by_hash:
+        filepath.unlink(missing_ok=True)  # don't keep the duplicate bytes
         return jsonify({
-            "error": "Duplicate content", 
+            "error": "Duplicate content",
             "message": f"This file content already exists as '{existing_by_hash['title']}' in class '{existing_by_hash['class_name']}' under topic '{existing_by_hash['topic_name']}'"
         }), 409
 
-    # ensure raw dir exists
-    class_raw_dir = Path(UPLOAD_RAWS) / topic_name / class_name
-    class_raw_dir.mkdir(parents=True, exist_ok=True)
-
-    filepath = class_raw_dir / filename
-    file.save(str(filepath))
-
-    # --- Extract text
-    if filename.endswith(".txt"):
-        raw_text = filepath.read_text(errors="ignore")
-    elif filename.endswith(".pdf"):
-        raw_text = extract_text_from_pdf(str(filepath))
-    elif filename.endswith((".jpg", ".jpeg", ".png")):
-        raw_text = extract_text_from_image(file)
-    else:
+    if not filename.endswith((".txt", ".pdf", ".jpg", ".jpeg", ".png")):
+        filepath.unlink(missing_ok=True)
         return jsonify({"error": "Unsupported file type"}), 400
 
-    if not raw_text.strip():
-        return jsonify({"error": "Could not extract text"}), 400
-
-    # --- AI processing (with chunking)
-    result = process_long_text(raw_text)
-    formatted_notes = result["cleaned"]
-    summary = result["summary"]
-
+    # Insert the pending row now so it's visible immediately, then hand the
+    # slow OCR + Claude + embedding work to the background executor
     note_id = str(uuid.uuid4())
-
-    # --- Save AI notes (processed markdown)
-    class_ai_dir = Path(UPLOAD_AI) / topic_name / class_name
-    class_ai_dir.mkdir(parents=True, exist_ok=True)
-    notes_path = class_ai_dir / f"{Path(filename).stem}_ai.md"
-    notes_path.write_text(formatted_notes, encoding="utf-8")
-
-    # --- Store embedding
-    note_id = str(uuid.uuid4())
-    store_embedding(note_id, formatted_notes)
-
-    # Save to database
     conn.execute("""
-        INSERT INTO notes (id, class_id, title, raw_path, cleaned_text, summary, created_at, notes_path, file_hash)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (note_id, class_id, file.filename, str(filepath), formatted_notes, json.dumps(summary),
-          datetime.now().isoformat(), str(notes_path), file_hash))
+        INSERT INTO notes (id, class_id, title, raw_path, created_at, file_hash, status)
+        VALUES (?, ?, ?, ?, ?, ?, 'pending')
+    """, (note_id, class_id, file.filename, str(filepath),
+          datetime.now().isoformat(), file_hash))
     conn.commit()
 
-    # Automatically generate concepts for Active Recall
-    try:
-        from active_recall import ActiveRecallSystem
-        ar_system = ActiveRecallSystem()
-        concept_ids = ar_system.generate_concepts_from_notes(class_id)
-        print(f"Auto-generated {len(concept_ids)} concepts for Active Recall from new upload")
-    except Exception as e:
-        print(f"Failed to auto-generate concepts: {e}")
-        # Don't fail the upload if concept generation fails
+    upload_executor.submit(
+        process_upload, note_id, str(filepath), filename, class_id,
+        topic_name, class_name, request.args.get("mode") == "batch")
 
     return jsonify({
         "id": note_id,
         "title": file.filename,
-        "notes": formatted_notes,
-        "summary": summary
-    })
+        "status": "pending"
+    }), 202
+
+
+@app.route("/api/notes/<note_id>/status", methods=["GET"])
+def get_note_status(note_id):
+    """Poll the state of a background upload"""
+    conn = get_db()
+    row = conn.execute(
+        "SELECT id, title, status, cleaned_text, summary FROM notes WHERE id=?",
+        (note_id,)
+    ).fetchone()
+    if not row:
+        return jsonify({"error": "Note not found"}), 404
+
+    payload = {"id": row["id"], "title": row["title"], "status": row["status"]}
+    if row["status"] == "ready":
+        payload["notes"] = row["cleaned_text"]
+        payload["summary"] = json.loads(row["summary"]) if row["summary"] else []
+    return jsonify(payload)
 
 
 @app.route("/api/notes/<class_id>", methods=["GET"])
@@ -285,6 +389,10 @@ def get_notes(class_id):
 
 
 # -------- SEARCH --------
+# Keyword (sqlite) and semantic (embedding model) searches are independent
+# and I/O/compute bound in different places, so hybrid runs them side by side
+search_executor = ThreadPoolExecutor(max_workers=2)
+
 @app.route("/api/search", methods=["GET"])
 def search_notes():
     query = request.args.get("q")
@@ -295,112 +403,132 @@ def search_notes():
     if not query:
         return jsonify({"error": "Missing query"}), 400
 
-    results = []
-    
-    # Keyword search
+    # Kick both searches off concurrently; hybrid latency becomes the
+    # slower of the two instead of their sum
+    keyword_future = semantic_future = None
     if search_type in ["hybrid", "keyword"]:
-        keyword_results = keyword_search(query, topic_id, class_id)
-        results.extend(keyword_results)
-    
-    # Semantic search
+        keyword_future = search_executor.submit(keyword_search, query, topic_id, class_id)
     if search_type in ["hybrid", "semantic"]:
+        semantic_future = search_executor.submit(semantic_search, query, topic_id, class_id)
+
+    keyword_results = keyword_future.result() if keyword_future else []
+    semantic_results = []
+    if semantic_future:
         try:
-            semantic_results = semantic_search(query, topic_id, class_id)
-            results.extend(semantic_results)
+            semantic_results = semantic_future.result()
         except Exception as e:
             print(f"Semantic search error: {e}")
             # Fall back to keyword search only
             if search_type == "semantic":
                 keyword_results = keyword_search(query, topic_id, class_id)
-                results.extend(keyword_results)
-    
-    # Remove duplicates and merge results
-    seen_ids = set()
-    unique_results = []
-    for result in results:
-        if result['id'] not in seen_ids:
-            seen_ids.add(result['id'])
-            unique_results.append(result)
-    
-    # Sort by relevance score (highest first), then by date for ties
-    unique_results.sort(key=lambda x: (
-        -x.get('score', 0),  # Primary sort: highest score first
-        -int(x.get('created_at', '').replace('-', '').replace(':', '').replace('T', '').replace('.', '')[:14] or '0')  # Secondary sort: newest first
-    ))
-    
+
+    # Merge in one pass, keeping the higher-scored entry per note
+    merged = {}
+    for result in keyword_results + semantic_results:
+        existing = merged.get(result['id'])
+        if existing is None or result.get('score', 0) > existing.get('score', 0):
+            merged[result['id']] = result
+    unique_results = list(merged.values())
+    
+    # Sort by relevance score (highest first), then by date for ties.
+    # One fromisoformat per row instead of the old five-replace string
+    # mangle and int parse.
+    def _rank_key(result):
+        created = result.get('created_at')
+        try:
+            ts = datetime.fromisoformat(created).timestamp() if created else 0.0
+        except ValueError:
+            ts = 0.0
+        return (-result.get('score', 0), -ts)
+
+    unique_results.sort(key=_rank_key)
+
     return jsonify(unique_results)
 
 def keyword_search(query, topic_id=None, class_id=None):
-    """Perform keyword-based search"""
+    """Perform keyword-based search via the notes_fts full-text index"""
     conn = get_db()
-    
-    # Search in both summary and cleaned_text fields
+
+    # Quote each token so user punctuation can't break FTS query syntax;
+    # multiple tokens AND together, matching the old substring behavior
+    tokens = re.findall(r"\w+", query)
+    if not tokens:
+        return []
+    match_query = " ".join(f'"{token}"' for token in tokens)
+
+    # bm25() is lower-is-better; negate it so merged results sort like the
+    # semantic cosine scores (higher = more relevant)
     sql = """
         SELECT n.id, n.title, n.summary, n.cleaned_text, n.created_at, n.class_id, n.raw_path,
-               c.name as class_name, t.name as topic_name, t.id as topic_id
-        FROM notes n
+               c.name as class_name, t.name as topic_name, t.id as topic_id,
+               -bm25(notes_fts) as score
+        FROM notes_fts
+        JOIN notes n ON n.rowid = notes_fts.rowid
         JOIN classes c ON n.class_id = c.id
         JOIN topics t ON c.topic_id = t.id
-        WHERE (n.summary LIKE ? OR n.cleaned_text LIKE ? OR n.title LIKE ?)
+        WHERE notes_fts MATCH ?
     """
-    
-    params = [f"%{query}%", f"%{query}%", f"%{query}%"]
-    
+
+    params = [match_query]
+
     if topic_id:
         sql += " AND t.id = ?"
         params.append(topic_id)
-    
+
     if class_id:
         sql += " AND c.id = ?"
         params.append(class_id)
-    
-    sql += " ORDER BY n.created_at DESC"
-    
+
+    sql += " ORDER BY bm25(notes_fts)"
+
     rows = conn.execute(sql, params).fetchall()
-    
+
+    # Compile the query once and reuse across every matched row; the old
+    # code lowercased each full text (an allocation per field per note)
+    # just to locate the match
+    query_pattern = re.compile(re.escape(query), re.IGNORECASE)
+
     # Format results with highlighted snippets
     results = []
     for row in rows:
         note = dict(row)
-        
+
         # Create snippets with context around the search term
         snippets = []
-        
-        # Check summary for matches
-        if note['summary'] and query.lower() in note['summary'].lower():
-            snippet = create_snippet(note['summary'], query)
+
+        if note['summary']:
+            snippet = create_snippet(note['summary'], query_pattern)
             if snippet:
                 snippets.append({"type": "summary", "text": snippet})
-        
-        # Check cleaned_text for matches
-        if note['cleaned_text'] and query.lower() in note['cleaned_text'].lower():
-            snippet = create_snippet(note['cleaned_text'], query)
+
+        if note['cleaned_text']:
+            snippet = create_snippet(note['cleaned_text'], query_pattern)
             if snippet:
                 snippets.append({"type": "content", "text": snippet})
-        
+
         note['snippets'] = snippets
         note['search_type'] = 'keyword'
-        note['score'] = 0.1  # Give keyword results a low score for consistent sorting
         results.append(note)
-    
+
     return results
 
-def create_snippet(text, query, context_chars=150):
-    """Create a snippet with context around the search term"""
-    if not text or not query:
+def create_snippet(text, query_pattern, context_chars=150):
+    """Create a snippet with context around the search term.
+
+    Takes a compiled case-insensitive pattern: one regex scan locates the
+    match without lowercasing a copy of the whole text first.
+    """
+    if not text:
         return ""
-    
-    text_lower = text.lower()
-    query_lower = query.lower()
-    
-    # Find the first occurrence of the query
-    index = text_lower.find(query_lower)
-    if index == -1:
+
+    match = query_pattern.search(text)
+    if not match:
         return ""
-    
+    index = match.start()
+
     # Calculate start and end positions for context
     start = max(0, index - context_chars // 2)
-    end = min(len(text), index + len(query) + context_chars // 2)
+    end = min(len(text), match.end() + context_chars // 2)
     
     # Adjust to word boundaries
     if start > 0:
@@ -506,9 +634,12 @@ def start_study_session(class_id):
                 "concepts_available": False
             })
         
-        # Get the first concept due for review
+        # One batched call prefetches a question for every due concept and
+        # seeds the question pool, so the rest of the session is served
+        # from the pool instead of paying an API round trip per step
+        questions = active_recall.generate_questions_batch(due_concepts)
         concept = due_concepts[0]
-        question = active_recall.generate_question(concept)
+        question = questions[0]
         
         return jsonify({
             "concept": {
@@ -541,32 +672,12 @@ def submit_answer():
         
         if not all([concept_id, question_text, user_answer]):
             return jsonify({"error": "Missing required fields"}), 400
-        
-        # Get the concept
-        conn = get_db()
-        concept_row = conn.execute(
-            "SELECT * FROM concepts WHERE id = ?", (concept_id,)
-        ).fetchone()
-        
-        if not concept_row:
+
+        # Single indexed fetch mapped through the shared row converter
+        concept = active_recall.get_concept(concept_id)
+        if not concept:
             return jsonify({"error": "Concept not found"}), 404
-        
-        # Create concept object
-        from active_recall import Concept, MasteryLevel, DifficultyLevel
-        concept = Concept(
-            id=concept_row['id'],
-            class_id=concept_row['class_id'],
-            name=concept_row['name'],
-            content=concept_row['content'],
-            mastery_level=MasteryLevel(concept_row['mastery_level']),
-            last_reviewed=datetime.fromisoformat(concept_row['last_reviewed']) if concept_row['last_reviewed'] else None,
-            next_review=datetime.fromisoformat(concept_row['next_review']),
-            review_count=concept_row['review_count'],
-            correct_streak=concept_row['correct_streak'],
-            difficulty_level=DifficultyLevel(concept_row['difficulty_level']),
-            created_at=datetime.fromisoformat(concept_row['created_at'])
-        )
-        
+
         # Create question object (simplified)
         from active_recall import Question
         question = Question(
@@ -576,19 +687,16 @@ def submit_answer():
             difficulty=concept.difficulty_level,
             question_type="recall"
         )
-        
+
         # Evaluate the answer
         evaluation = active_recall.evaluate_answer(question, user_answer, concept)
-        
-        # Update concept progress
-        updated_concept = active_recall.update_concept_progress(concept, evaluation['correct'])
-        
-        # Save review session
-        session_id = active_recall.save_review_session(
-            concept_id, question_text, user_answer, 
+
+        # Progress update + session insert in one transaction (one fsync)
+        updated_concept, session_id = active_recall.record_review(
+            concept, question_text, user_answer,
             evaluation['correct'], evaluation['feedback']
         )
-        
+
         return jsonify({
             "session_id": session_id,
             "correct": evaluation['correct'],
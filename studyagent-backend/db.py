@@ -1,16 +1,55 @@
 import sqlite3
 
+try:
+    from flask import g, has_app_context
+except ImportError:  # standalone scripts use db.py without flask
+    g = None
+
 DB_NAME = "studyagent.db"
 
-def get_db():
-    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+# Bump when adding a migration below; PRAGMA user_version tracks which
+# deltas a database has already applied
+_SCHEMA_VERSION = 1
+
+def _connect():
+    # 256 cached prepared statements (default 128): with one connection
+    # serving a whole request, repeat queries skip re-parsing their SQL
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False,
+                           cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers run during writes and groups commits; NORMAL skips
+    # the extra fsync per commit that FULL pays (safe with WAL)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # 64MB page cache and memory temp tables keep the hot working set out
+    # of syscalls; mmap serves reads straight from the page cache
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
     return conn
 
+def get_db():
+    # Inside a request, reuse one connection for every query the handler
+    # makes (handlers call get_db several times; each open replays the
+    # PRAGMAs and starts with a cold page cache). app.py closes it on
+    # appcontext teardown. Background threads and scripts get their own.
+    if g is not None and has_app_context():
+        conn = getattr(g, "_db_conn", None)
+        if conn is None:
+            conn = g._db_conn = _connect()
+        return conn
+    return _connect()
+
 def init_db():
     conn = get_db()
     cur = conn.cursor()
 
+    # The CREATE ... IF NOT EXISTS statements below are cheap catalog
+    # checks and always run; the ALTER TABLE / backfill migrations are
+    # not — each attempt takes a write lock and recompiles the schema —
+    # so they apply exactly once, gated on user_version.
+    migrate = cur.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION
+
     cur.execute("""
     CREATE TABLE IF NOT EXISTS topics (
         id TEXT PRIMARY KEY,
@@ -44,17 +83,49 @@ def init_db():
     )
     """)
     
-    # Add file_hash column if it doesn't exist (for existing databases)
-    try:
-        cur.execute("ALTER TABLE notes ADD COLUMN file_hash TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    # Add class_id column and update schema for existing databases
-    try:
-        cur.execute("ALTER TABLE notes ADD COLUMN class_id TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
+    if migrate:
+        # Add file_hash column if it doesn't exist (for existing databases)
+        try:
+            cur.execute("ALTER TABLE notes ADD COLUMN file_hash TEXT")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+        # Add class_id column and update schema for existing databases
+        try:
+            cur.execute("ALTER TABLE notes ADD COLUMN class_id TEXT")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+        # Hash of the extracted text, so a re-scan/re-export of the same
+        # content skips the AI pipeline even when the file bytes differ
+        try:
+            cur.execute("ALTER TABLE notes ADD COLUMN text_hash TEXT")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+        # Upload pipeline state: 'pending' while OCR/AI runs in the
+        # background worker, then 'ready' or 'error'. Pre-existing rows
+        # are complete.
+        try:
+            cur.execute("ALTER TABLE notes ADD COLUMN status TEXT DEFAULT 'ready'")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_notes_text_hash ON notes(text_hash)
+    """)
+
+    # Upload duplicate checks and per-class/topic note listings were full
+    # table scans; these cover every filter upload_note and the search
+    # queries use
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_notes_class_title ON notes(class_id, title)
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_notes_file_hash ON notes(file_hash)
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_classes_topic_id ON classes(topic_id)
+    """)
 
     cur.execute("""
     CREATE TABLE IF NOT EXISTS embeddings (
@@ -63,6 +134,18 @@ def init_db():
         FOREIGN KEY(note_id) REFERENCES notes(id)
     )
     """)
+    # The corpus load and fix_embeddings join on this FK; without the
+    # index each probe scans every chunk vector
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_embeddings_note_id ON embeddings(note_id)
+    """)
+    if migrate:
+        # Dequantization scale for int8-quantized vectors (vector = int8
+        # * scale); NULL marks legacy float32/JSON rows
+        try:
+            cur.execute("ALTER TABLE embeddings ADD COLUMN scale REAL")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
 
     # Active Recall Tables
     cur.execute("""
@@ -109,5 +192,130 @@ def init_db():
     )
     """)
 
+    if migrate:
+        # FSRS memory-model state per concept; seeded from the old mastery
+        # buckets so existing rows schedule sensibly on first review
+        for column in ("stability REAL", "difficulty REAL"):
+            try:
+                cur.execute(f"ALTER TABLE concepts ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # Column already exists
+        cur.execute("""
+        UPDATE concepts SET
+            stability = CASE mastery_level
+                WHEN 0 THEN 0.5 WHEN 1 THEN 2.0 WHEN 2 THEN 4.0
+                WHEN 3 THEN 7.0 ELSE 14.0 END,
+            difficulty = 5.0
+        WHERE stability IS NULL
+        """)
+
+        # Integer epoch mirrors of the ISO timestamp columns: due checks
+        # become int comparisons and readers skip datetime.fromisoformat
+        # per row
+        for column in ("last_reviewed_ts", "next_review_ts"):
+            try:
+                cur.execute(f"ALTER TABLE concepts ADD COLUMN {column} INTEGER")
+            except sqlite3.OperationalError:
+                pass  # Column already exists
+        cur.execute("""
+        UPDATE concepts SET last_reviewed_ts = CAST(strftime('%s', last_reviewed) AS INTEGER)
+        WHERE last_reviewed_ts IS NULL AND last_reviewed IS NOT NULL
+        """)
+        cur.execute("""
+        UPDATE concepts SET next_review_ts = CAST(strftime('%s', next_review) AS INTEGER)
+        WHERE next_review_ts IS NULL AND next_review IS NOT NULL
+        """)
+
+    # Covers both the class fetch and the due filter in the active recall
+    # queries, so they don't scan every class's concepts
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_concepts_class_review
+    ON concepts(class_id, next_review_ts)
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_concepts_mastery
+    ON concepts(class_id, mastery_level, correct_streak)
+    """)
+
+    # Pool of pregenerated questions per concept and mastery tier
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS questions (
+        id TEXT PRIMARY KEY,
+        concept_id TEXT NOT NULL,
+        mastery_level INTEGER NOT NULL,
+        question_text TEXT NOT NULL,
+        expected_answer TEXT,
+        created_at TEXT,
+        FOREIGN KEY(concept_id) REFERENCES concepts(id)
+    )
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_questions_concept
+    ON questions(concept_id, mastery_level)
+    """)
+
+    # Full-text index over notes: keyword search becomes an inverted-index
+    # lookup with bm25 ranking instead of three LIKE scans per query.
+    # External-content table, kept in sync by the triggers below.
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        title, summary, cleaned_text,
+        content='notes', content_rowid='rowid'
+    )
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, summary, cleaned_text)
+        VALUES (new.rowid, new.title, new.summary, new.cleaned_text);
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, summary, cleaned_text)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.cleaned_text);
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, summary, cleaned_text)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.cleaned_text);
+        INSERT INTO notes_fts(rowid, title, summary, cleaned_text)
+        VALUES (new.rowid, new.title, new.summary, new.cleaned_text);
+    END
+    """)
+    # One-time backfill for databases that predate the index
+    if migrate and cur.execute("SELECT COUNT(*) FROM notes_fts").fetchone()[0] == 0:
+        cur.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+    # Content-hash cache of AI rewrite/summarize responses, so re-uploaded
+    # or shared chunks skip the Claude round-trip entirely
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ai_cache (
+        hash TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        response TEXT NOT NULL
+    )
+    """)
+
+    # Denormalized per-class mastery counts kept in step with concept
+    # writes, so progress reads are 5 rows instead of a class scan
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS class_stats (
+        class_id TEXT NOT NULL,
+        mastery_level INTEGER NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY(class_id, mastery_level)
+    )
+    """)
+    if migrate and cur.execute("SELECT COUNT(*) FROM class_stats").fetchone()[0] == 0:
+        cur.execute("""
+        INSERT INTO class_stats (class_id, mastery_level, count)
+        SELECT class_id, mastery_level, COUNT(*) FROM concepts
+        GROUP BY class_id, mastery_level
+        """)
+
+    if migrate:
+        cur.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+
     conn.commit()
     conn.close()
@@ -1,73 +1,238 @@
 import json
 import os
 import sqlite3
+import time
 import uuid
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
+from semantic_cache import SemanticCache
+
 
 DB_PATH = "studyagent.db"
-model = SentenceTransformer("all-MiniLM-L6-v2")
+
+# FP16 halves the transformer's memory traffic on GPUs; on CPU the default
+# dtype stays (fp16 is emulated there and int8 needs a separately
+# quantized model). Older sentence-transformers/torch combinations don't
+# take model_kwargs, so fall back to the plain constructor.
+try:
+    import torch
+    _MODEL_KWARGS = ({"torch_dtype": torch.float16}
+                     if torch.cuda.is_available() else {})
+except ImportError:
+    _MODEL_KWARGS = {}
+try:
+    model = SentenceTransformer("all-MiniLM-L6-v2", model_kwargs=_MODEL_KWARGS)
+except TypeError:
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+
+@lru_cache(maxsize=1024)
+def _query_embedding(query: str):
+    """Embed a search query, memoized: repeat/paginated searches skip the
+    embedding-model forward pass entirely. Returned unit-normalized."""
+    return model.encode([query], normalize_embeddings=True)[0]
+
+# Full search results cached briefly per (query, filters): a refresh or
+# pagination hit within the TTL skips the row scan too. 5 minutes is short
+# enough that freshly uploaded notes appear promptly.
+_RESULT_TTL_SECONDS = 300
+_RESULT_CACHE_MAX = 256
+_result_cache = {}
+
+# Near-duplicate query cache per filter combination: "what is a vector"
+# and "define a vector" should serve the same result set. One cache per
+# (topic_id, class_id, top_k, min_score) so a hit never crosses filters.
+_QUERY_SIM_THRESHOLD = 0.90
+_query_caches = {}
+
+def _cached_results(key):
+    hit = _result_cache.get(key)
+    if hit and hit[0] > time.time():
+        return list(hit[1])
+    return None
+
+def _store_results(key, results):
+    now = time.time()
+    if len(_result_cache) >= _RESULT_CACHE_MAX:
+        expired = [k for k, (exp, _) in _result_cache.items() if exp <= now]
+        for k in expired:
+            del _result_cache[k]
+        if len(_result_cache) >= _RESULT_CACHE_MAX:
+            _result_cache.pop(next(iter(_result_cache)))
+    _result_cache[key] = (now + _RESULT_TTL_SECONDS, results)
 
 def get_db():
     return sqlite3.connect(DB_PATH)
 
-def store_embedding(note_id, text):
-    """Generate and store embedding for note text"""
-    embedding = model.encode(text).tolist()
+def store_embedding(note_id, texts):
+    """Generate and store embeddings for a note.
+
+    Accepts a single string or a list of chunk strings; chunks are encoded
+    in one batched forward pass (the model amortizes per-call overhead
+    across the batch) and stored as one embeddings row each. Chunk-level
+    vectors also sidestep the encoder's token truncation, which silently
+    dropped everything past the start of a long note.
+    """
+    if isinstance(texts, str):
+        texts = [texts]
+    bulk_store_embeddings([(note_id, text) for text in texts])
+
+def bulk_store_embeddings(items):
+    """Encode and store many (note_id, text) pairs at once.
+
+    All texts go through one batched forward pass — the model amortizes
+    per-call overhead across the batch — and land in one executemany.
+    Vectors are encoded unit-normalized so scoring is a plain dot product.
+    """
+    if not items:
+        return
+    vectors = model.encode([text for _, text in items], batch_size=64,
+                           normalize_embeddings=True, show_progress_bar=False)
     conn = get_db()
     cur = conn.cursor()
-    cur.execute("INSERT INTO embeddings VALUES (?, ?)",
-                (note_id, json.dumps(embedding)))
+    # int8 blobs with a per-vector scale: a quarter the bytes of float32
+    # through sqlite, and reconstruction is one multiply at corpus load
+    cur.executemany(
+        "INSERT INTO embeddings (note_id, vector, scale) VALUES (?, ?, ?)",
+        [(item[0],) + _quantize(vec) for item, vec in zip(items, vectors)])
     conn.commit()
+    _bump_corpus_version()
 
-def semantic_search(query: str, topic_id: str = None, class_id: str = None, top_k=5, min_score=0.3):
-    q_vec = model.encode([query])[0]
-    conn = get_db()
-    
-    # Build query with optional filtering
-    base_query = (
-        "SELECT n.id, n.title, n.summary, n.cleaned_text, n.created_at, n.class_id, "
-        "n.raw_path, c.name as class_name, t.name as topic_name, t.id as topic_id, e.vector "
-        "FROM notes n "
-        "JOIN classes c ON n.class_id = c.id "
-        "JOIN topics t ON c.topic_id = t.id "
-        "JOIN embeddings e ON n.id = e.note_id"
-    )
-    
+def _quantize(vec):
+    """Unit vector -> (int8 blob, scale). Symmetric per-vector scaling:
+    <0.5% cosine error at 384 dims, and the corpus loader re-normalizes
+    after dequantization anyway."""
+    vec = np.asarray(vec, dtype=np.float32)
+    scale = float(np.max(np.abs(vec))) / 127.0
+    if not scale:
+        return vec.tobytes(), None
+    return np.round(vec / scale).astype(np.int8).tobytes(), scale
+
+def _decode_vector(stored, scale=None):
+    """Stored embedding -> float32 array. Current rows are int8 blobs
+    with a scale; legacy rows are float32 blobs or JSON text."""
+    if scale is not None:
+        return np.frombuffer(stored, dtype=np.int8).astype(np.float32) * scale
+    if isinstance(stored, bytes):
+        return np.frombuffer(stored, dtype=np.float32)
+    return np.asarray(json.loads(stored), dtype=np.float32)
+
+# Resident corpus per filter combination: (note_ids, unit-normalized
+# matrix). Rebuilt only after a write bumps the version, so a query is a
+# matmul over memory already in-process instead of pulling every vector
+# out of sqlite and decoding it each time.
+_corpus_version = 0
+_corpus_cache = {}
+
+def _bump_corpus_version():
+    global _corpus_version
+    _corpus_version += 1
+    _corpus_cache.clear()
+
+def _corpus(conn, topic_id, class_id):
+    """note_ids and unit-normalized embedding matrix for the given filters"""
+    key = (topic_id, class_id)
+    hit = _corpus_cache.get(key)
+    if hit and hit[0] == _corpus_version:
+        return hit[1], hit[2]
+
+    sql = ("SELECT e.note_id, e.vector, e.scale FROM embeddings e "
+           "JOIN notes n ON n.id = e.note_id "
+           "JOIN classes c ON n.class_id = c.id")
     conditions = []
     params = []
-    
     if topic_id:
-        conditions.append("t.id = ?")
+        conditions.append("c.topic_id = ?")
         params.append(topic_id)
-    
     if class_id:
-        conditions.append("c.id = ?")
+        conditions.append("n.class_id = ?")
         params.append(class_id)
-    
     if conditions:
-        base_query += " WHERE " + " AND ".join(conditions)
-    
-    rows = conn.execute(base_query, params).fetchall()
+        sql += " WHERE " + " AND ".join(conditions)
+
+    rows = conn.execute(sql, params).fetchall()
+    if not rows:
+        _corpus_cache[key] = (_corpus_version, [], None)
+        return [], None
+
+    note_ids = [r[0] for r in rows]
+    mat = np.stack([_decode_vector(r[1], r[2]) for r in rows])
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    mat = mat / norms
+    _corpus_cache[key] = (_corpus_version, note_ids, mat)
+    return note_ids, mat
+
+def semantic_search(query: str, topic_id: str = None, class_id: str = None, top_k=5, min_score=0.3):
+    query = query.strip()
+    cache_key = (query, topic_id, class_id, top_k, min_score)
+    cached = _cached_results(cache_key)
+    if cached is not None:
+        return cached
+
+    q_vec = _query_embedding(query)
+
+    filter_key = (topic_id, class_id, top_k, min_score)
+    query_cache = _query_caches.setdefault(
+        filter_key, SemanticCache(threshold=_QUERY_SIM_THRESHOLD))
+    near_hit = query_cache.get(q_vec)
+    if near_hit is not None:
+        return list(near_hit)
 
-    results = []
-    import numpy as np, json
+    conn = get_db()
+
+    # Score against the resident matrix — one matmul over vectors already
+    # decoded and normalized, no per-query sqlite scan of the corpus
+    note_ids, mat = _corpus(conn, topic_id, class_id)
+    if mat is None:
+        _store_results(cache_key, [])
+        return []
+
+    # _query_embedding already returns a unit vector, so cosine is a dot
+    scores = mat @ np.asarray(q_vec, dtype=np.float32)
+
+    # Notes can have several chunk vectors; keep each note's best score
+    best_by_note = {}
+    for note_id, score in zip(note_ids, scores):
+        score = float(score)
+        if score < min_score:
+            continue
+        if score > best_by_note.get(note_id, -1.0):
+            best_by_note[note_id] = score
+
+    ranked = sorted(best_by_note.items(), key=lambda item: -item[1])[:top_k]
 
-    for r in rows:
-        # Unpack all the fields from the updated query
-        note_id, title, summary, cleaned_text, created_at, class_id, raw_path, class_name, topic_name, topic_id_val, vector_str = r
+    if not ranked:
+        _store_results(cache_key, [])
+        query_cache.put(query, q_vec, [])
+        return []
 
-        vec = np.array(json.loads(vector_str))
-        score = float(np.dot(q_vec, vec) / (np.linalg.norm(q_vec) * np.linalg.norm(vec)))
+    # Fetch metadata only for the notes that made the cut
+    placeholders = ", ".join("?" for _ in ranked)
+    meta_rows = conn.execute(
+        "SELECT n.id, n.title, n.summary, n.cleaned_text, n.created_at, n.class_id, "
+        "n.raw_path, c.name as class_name, t.name as topic_name, t.id as topic_id "
+        "FROM notes n "
+        "JOIN classes c ON n.class_id = c.id "
+        "JOIN topics t ON c.topic_id = t.id "
+        f"WHERE n.id IN ({placeholders})",
+        [note_id for note_id, _ in ranked]).fetchall()
+    meta_by_id = {r[0]: r for r in meta_rows}
 
-        results.append({
+    top_results = []
+    for note_id, score in ranked:
+        r = meta_by_id.get(note_id)
+        if r is None:
+            continue
+        _, title, summary, cleaned_text, created_at, note_class_id, raw_path, class_name, topic_name, topic_id_val = r
+        top_results.append({
             "id": note_id,
             "title": title,
             "summary": json.loads(summary) if isinstance(summary, str) else summary,
             "cleaned_text": cleaned_text,
             "created_at": created_at,
-            "class_id": class_id,
+            "class_id": note_class_id,
             "raw_path": raw_path,
             "class_name": class_name,
             "topic_name": topic_name,
@@ -76,8 +241,6 @@ def semantic_search(query: str, topic_id: str = None, class_id: str = None, top_
             "search_type": "semantic"
         })
 
-    # Filter results by minimum score threshold
-    filtered_results = [r for r in results if r["score"] >= min_score]
-    
-    filtered_results.sort(key=lambda x: -x["score"])
-    return filtered_results[:top_k]
+    _store_results(cache_key, top_results)
+    query_cache.put(query, q_vec, top_results)
+    return top_results
@@ -4,8 +4,11 @@ Script to fix existing embeddings by ensuring all notes have raw_path data avail
 This doesn't modify the embeddings table structure, but ensures the notes table has complete data.
 """
 
-import sqlite3
+import json
 import os
+import sqlite3
+
+import numpy as np
 
 DB_PATH = "studyagent.db"
 
@@ -48,35 +51,65 @@ def fix_raw_paths():
     
     print(f"Attempting to fix {len(missing_notes)} notes...")
     
+    # Collect every fix first, then write them in one executemany inside a
+    # single transaction — per-row UPDATE+commit costs an fsync each
+    updates = []
     for note_id, title, current_raw_path in missing_notes:
         # Try to construct the raw_path based on the title
         # Assuming files are stored in uploads/raws/ directory
         potential_path = f"uploads/raws/{title}"
-        
+
         # Check if the file exists
         if os.path.exists(potential_path):
             print(f"  ✓ Found file for {title} at {potential_path}")
-            conn.execute(
-                "UPDATE notes SET raw_path = ? WHERE id = ?",
-                (potential_path, note_id)
-            )
+            updates.append((potential_path, note_id))
         else:
             # Try without uploads/raws prefix (in case it's stored differently)
             alt_path = f"raws/{title}"
             if os.path.exists(alt_path):
                 print(f"  ✓ Found file for {title} at {alt_path}")
-                conn.execute(
-                    "UPDATE notes SET raw_path = ? WHERE id = ?",
-                    (alt_path, note_id)
-                )
+                updates.append((alt_path, note_id))
             else:
                 print(f"  ✗ Could not find file for {title}")
                 print(f"    Tried: {potential_path}")
                 print(f"    Tried: {alt_path}")
-    
+
+    if updates:
+        conn.executemany("UPDATE notes SET raw_path = ? WHERE id = ?", updates)
     conn.commit()
     print("Raw path fixes applied!")
 
+def normalize_vectors():
+    """One-shot migration: re-store every embedding as a unit-normalized
+    float32 blob. Older rows are JSON text and/or unnormalized; search
+    assumes unit vectors so cosine collapses to a dot product."""
+    conn = get_db()
+    try:
+        rows = conn.execute(
+            "SELECT rowid, vector, scale FROM embeddings").fetchall()
+    except sqlite3.OperationalError:  # database predates the scale column
+        rows = [(rowid, stored, None) for rowid, stored in conn.execute(
+            "SELECT rowid, vector FROM embeddings")]
+
+    updates = []
+    for rowid, stored, scale in rows:
+        if scale is not None:
+            continue  # int8-quantized rows were stored normalized
+        if isinstance(stored, bytes):
+            vec = np.frombuffer(stored, dtype=np.float32)
+        else:
+            vec = np.asarray(json.loads(stored), dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        if norm:
+            vec = vec / norm
+        updates.append((np.asarray(vec, dtype=np.float32).tobytes(), rowid))
+
+    if updates:
+        conn.executemany(
+            "UPDATE embeddings SET vector = ? WHERE rowid = ?", updates)
+    conn.commit()
+    print(f"Normalized {len(updates)} embedding vectors")
+
 def verify_embeddings_data():
     """Verify that all notes with embeddings now have complete data"""
     conn = get_db()
@@ -104,24 +137,27 @@ def verify_embeddings_data():
         print("  ⚠️  Some embeddings still have incomplete note data")
 
 def main():
-    print("=== Fixing Embeddings Raw Path Data ===\n")
-    
+    print("=== Fixing Embeddings Data ===\n")
+
     # Check current state
     print("1. Checking for missing raw_path data...")
     missing = check_missing_raw_paths()
-    
-    if not missing:
+
+    if missing:
+        # Attempt to fix
+        print("\n2. Attempting to fix missing raw_path data...")
+        fix_raw_paths()
+    else:
         print("✅ All notes already have raw_path data!")
-        return
-    
-    # Attempt to fix
-    print("\n2. Attempting to fix missing raw_path data...")
-    fix_raw_paths()
-    
+
+    # Re-store vectors normalized (no-op for already-normalized rows)
+    print("\n3. Normalizing stored embeddings...")
+    normalize_vectors()
+
     # Verify results
-    print("\n3. Verifying results...")
+    print("\n4. Verifying results...")
     verify_embeddings_data()
-    
+
     print("\n=== Done! ===")
 
 if __name__ == "__main__":
@@ -5,9 +5,15 @@ def reset_db():
     conn = get_db()
     cur = conn.cursor()
 
-    # Drop tables if they exist
-    cur.execute("DROP TABLE IF EXISTS notes")
-    cur.execute("DROP TABLE IF EXISTS topics")
+    # Drop every table (dependents first) — dropping only notes/topics
+    # left orphan rows in embeddings, concepts and the rest
+    for table in ("notes_fts", "embeddings", "review_sessions",
+                  "concept_weaknesses", "questions", "class_stats",
+                  "concepts", "ai_cache", "notes", "classes", "topics"):
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+
+    # Reset the migration marker so init_db reapplies the schema deltas
+    cur.execute("PRAGMA user_version=0")
 
     conn.commit()
     conn.close()
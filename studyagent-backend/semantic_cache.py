@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+
+
+class SemanticCache:
+    """Embedding-keyed cache for near-duplicate texts.
+
+    Exact-hash caches miss when two texts differ trivially ("what is a
+    vector" vs "define vector", or a rescan with a one-character OCR diff).
+    This keeps unit-normalized embeddings alongside their responses and
+    returns the stored response for the nearest neighbour when its cosine
+    similarity clears the threshold. Brute-force dot products are fine at
+    this scale (≤10k entries × 384 dims is a single small matmul).
+    """
+
+    # Near-identical texts update the existing entry instead of growing
+    _UPDATE_THRESHOLD = 0.95
+
+    def __init__(self, threshold: float, ttl_seconds: int = 300, max_entries: int = 10_000):
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._vectors = []   # unit-normalized embeddings
+        self._entries = []   # parallel (text, response, expires_at)
+
+    @staticmethod
+    def _normalize(embedding):
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def _nearest(self, unit_vec):
+        if not self._vectors:
+            return -1, -1.0
+        sims = np.stack(self._vectors) @ unit_vec
+        best = int(np.argmax(sims))
+        return best, float(sims[best])
+
+    def get(self, embedding):
+        """Return the cached response for the nearest stored text, or None"""
+        unit_vec = self._normalize(embedding)
+        best, sim = self._nearest(unit_vec)
+        if best < 0 or sim < self.threshold:
+            return None
+        text, response, expires_at = self._entries[best]
+        if expires_at <= time.time():
+            del self._vectors[best]
+            del self._entries[best]
+            return None
+        return response
+
+    def put(self, text, embedding, response):
+        unit_vec = self._normalize(embedding)
+        expires_at = time.time() + self.ttl
+        best, sim = self._nearest(unit_vec)
+        if best >= 0 and sim >= self._UPDATE_THRESHOLD:
+            self._vectors[best] = unit_vec
+            self._entries[best] = (text, response, expires_at)
+            return
+        if len(self._entries) >= self.max_entries:
+            self._evict()
+        self._vectors.append(unit_vec)
+        self._entries.append((text, response, expires_at))
+
+    def _evict(self):
+        """Drop expired entries, then the oldest if still at capacity"""
+        now = time.time()
+        live = [(v, e) for v, e in zip(self._vectors, self._entries) if e[2] > now]
+        if len(live) >= self.max_entries:
+            live = live[1:]
+        self._vectors = [v for v, _ in live]
+        self._entries = [e for _, e in live]